@@ -0,0 +1,56 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+LOG_PATH = os.path.join("dat", "app.log")
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Rotate the log at 1 MB and keep three old files (app.log.1 ... app.log.3)
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 3
+
+_listener = None
+
+
+# Formatter that appends the structured fields of a record, e.g. the ones
+# written by timing.timed(), as JSON. It runs on the listener thread, so the
+# serialisation does not cost the thread that logged the record.
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message = f"{message} {json.dumps(fields, ensure_ascii=False, default=str)}"
+        return message
+
+
+# Send all logging through a queue to a background thread that writes a
+# rotating dat/app.log, so logging never blocks the UI thread on file I/O.
+# Calling it again is a no-op.
+def setup_logging(log_path=LOG_PATH, level=logging.INFO, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    global _listener
+    if _listener is not None:
+        return
+
+    file_handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+# Write out everything still queued and stop the background thread
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
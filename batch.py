@@ -0,0 +1,201 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from line_index import arrange_segments
+from renderers import FORMATS, EXTENSIONS, render_report
+
+
+# Load review jobs from a JSON file (a single review, a list of reviews or
+# {"reviews": [...]}) or from a JSONL file with one review per line
+def load_jobs(input_path):
+    logging.info(f"Loading review jobs from {input_path}...")
+    with open(input_path, "r", encoding="utf-8") as f:
+        if input_path.endswith(".jsonl"):
+            reviews = [json.loads(line) for line in f if line.strip()]
+        else:
+            reviews = json.load(f)
+    if isinstance(reviews, dict):
+        reviews = reviews.get("reviews", [reviews])
+    logging.info(f"Loaded {len(reviews)} review jobs.")
+    return reviews
+
+
+# Build the output path of a job: an explicit "output" key wins, otherwise the
+# file name from the header is turned into a safe file name inside out_dir
+def job_output_path(index, review, out_dir, output_format="pdf"):
+    if review.get("output"):
+        return review["output"]
+    app_data = review.get("app_data")
+    file_name = (app_data.get("file_name") if isinstance(app_data, dict) else None) or "review"
+    safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.basename(file_name)).strip("._") or "review"
+    return os.path.join(out_dir, f"{index + 1:05d}_{safe_name}{EXTENSIONS[output_format]}")
+
+
+# Read the segments of a review one JSONL line at a time
+def iter_segments_file(segments_path):
+    with open(segments_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Render a single job in a worker process. Reviews may point to a JSONL file
+# of segments ("segments_file") instead of embedding "segments_data"; those
+# segments are read lazily when streaming. Formats other than PDF are always
+# streamed and never load reportlab. Ordering by line needs all segments, so
+# it reads a segments file in full.
+def render_job(index, output_path, app_data, segments_data, segments_file=None, stream=False, template=None,
+               output_format="pdf", order="entry"):
+    start = time.perf_counter()
+    stream = stream or output_format != "pdf"
+    try:
+        if segments_file:
+            segments_data = iter_segments_file(segments_file)
+            if not stream:
+                segments_data = list(segments_data)
+        if order == "lines":
+            segments_data = arrange_segments(segments_data)
+        if stream:
+            result = render_report(output_path, output_format, app_data, segments_data, template=template)
+            segment_count = result["segments"]
+        else:
+            from report import generate_pdf
+            generate_pdf(output_path, app_data, segments_data, template=template)
+            segment_count = len(segments_data)
+        error = None
+    except Exception as e:
+        logging.error(f"Failed to render job {index + 1}: {e}")
+        error = f"{type(e).__name__}: {e}"
+        segment_count = 0
+    return {
+        "index": index,
+        "output": output_path,
+        "segments": segment_count,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+
+
+def failed_job(index, output_path, error):
+    return {"index": index, "output": output_path, "segments": 0, "seconds": 0.0, "error": error}
+
+
+# Render all jobs across a process pool and return a summary. Invalid entries
+# and jobs whose worker process died are counted as failed jobs; a dead worker
+# breaks the pool, so the jobs still waiting for it fail as well.
+def run_batch(reviews, out_dir, workers=None, stream=False, template=None, output_format="pdf", order="entry"):
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for index, review in enumerate(reviews):
+            if not isinstance(review, dict):
+                results.append(failed_job(index, job_output_path(index, {}, out_dir, output_format),
+                                          f"Not a review object: {type(review).__name__}"))
+                continue
+            app_data = review.get("app_data")
+            segments_data = review.get("segments_data", [])
+            output_path = job_output_path(index, review, out_dir, output_format)
+            if not isinstance(app_data, dict):
+                results.append(failed_job(index, output_path, "Missing app_data"))
+                continue
+            try:
+                future = executor.submit(render_job, index, output_path, app_data, segments_data,
+                                         review.get("segments_file"), stream, review.get("theme", template),
+                                         output_format, order)
+            except BrokenProcessPool as e:
+                results.append(failed_job(index, output_path, f"Worker process crashed: {e}"))
+                continue
+            futures[future] = (index, output_path)
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                index, output_path = futures[future]
+                logging.error(f"Failed to render job {index + 1}: worker process crashed.")
+                results.append(failed_job(index, output_path, f"Worker process crashed: {e}"))
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda result: result["index"])
+    failures = [result for result in results if result["error"]]
+    succeeded = len(results) - len(failures)
+    segments = sum(result["segments"] for result in results if not result["error"])
+    return {
+        "jobs": len(results),
+        "succeeded": succeeded,
+        "failed": len(failures),
+        "seconds": elapsed,
+        "reports_per_second": succeeded / elapsed if elapsed else 0.0,
+        "segments_per_second": segments / elapsed if elapsed else 0.0,
+        "failures": [{"index": f["index"] + 1, "output": f["output"], "error": f["error"]} for f in failures],
+        "results": results,
+    }
+
+
+# Record the successfully rendered reviews of a batch in the review index
+def index_reviews(reviews, summary):
+    from review_index import backfill
+
+    def indexed():
+        for result in summary["results"]:
+            if result["error"]:
+                continue
+            review = reviews[result["index"]]
+            segments_data = review.get("segments_data", [])
+            if review.get("segments_file"):
+                segments_data = list(iter_segments_file(review["segments_file"]))
+            yield review["app_data"], segments_data, result["output"]
+
+    review_count, segment_count = backfill(indexed())
+    print(f"Indexed {review_count} reviews with {segment_count} segments.")
+
+
+def print_summary(summary):
+    print(f"Jobs: {summary['jobs']}  succeeded: {summary['succeeded']}  failed: {summary['failed']}")
+    print(f"Elapsed: {summary['seconds']:.2f}s  "
+          f"({summary['reports_per_second']:.2f} reports/s, {summary['segments_per_second']:.1f} segments/s)")
+    for failure in summary["failures"]:
+        print(f"  job {failure['index']} -> {failure['output']}: {failure['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render code review reports without the UI.")
+    parser.add_argument("input", help="JSON or JSONL file with app_data/segments_data reviews")
+    parser.add_argument("-o", "--out-dir", default="reports", help="directory for the generated reports")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="pdf",
+                        help="output format; json, markdown and html do not need reportlab")
+    parser.add_argument("--stream", action="store_true",
+                        help="lay out segments page by page to use less memory on very large reviews")
+    parser.add_argument("--order", choices=["entry", "lines"], default="entry",
+                        help="order of the segments; lines also merges duplicates and groups overlapping ranges")
+    parser.add_argument("--theme", help="report theme from dat/themes.json (default: the built-in look)")
+    parser.add_argument("--index", action="store_true",
+                        help="record the reports in the searchable review index (see review_index.py)")
+    parser.add_argument("--summary-json", help="also write the summary to this JSON file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress (including pages/s) to stderr")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    reviews = load_jobs(args.input)
+    summary = run_batch(reviews, args.out_dir, args.workers, args.stream, args.theme, args.format, args.order)
+    print_summary(summary)
+    if args.index:
+        index_reviews(reviews, summary)
+    if args.summary_json:
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
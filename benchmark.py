@@ -0,0 +1,442 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import datetime
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import lang_catalog
+from renderers import EXTENSIONS, RENDERERS, render_report
+from segment_store import SEGMENT_TYPES
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORDS = ("value", "check", "return", "loop", "index", "missing", "handle", "error", "cache", "input",
+         "should", "never", "before", "after", "the", "this", "is", "not", "a", "call")
+
+# Words per description
+DESCRIPTION_LENGTHS = {"short": (5, 15), "long": (150, 400)}
+
+DEFAULT_SIZES = [10, 1000]
+SUITES = ["pdf", "renderers", "ui", "startup"]
+
+# Hot spots and allocation sites kept per case by --profile and --tracemalloc
+TOP_ENTRIES = 15
+
+
+def languages():
+    return lang_catalog.compile_catalog(os.path.join(REPO_DIR, "lang"))["languages"]
+
+
+# Build a synthetic review with the same structure the app gathers from the
+# form, labelled in one of the languages of lang/
+def synthetic_review(segment_count, seed=0, language=None, description="short"):
+    rng = random.Random(seed)
+    language = language or languages()[lang_catalog.FALLBACK_LANGUAGE]["main"]
+    low, high = DESCRIPTION_LENGTHS[description]
+    app_data = {
+        'app_title': language["app_title"],
+        'file_name_label': language["file_name"],
+        'file_name': "example.py",
+        'controller_name_label': language["controller_name"],
+        'controller_name': "Benchmark",
+        'current_date_label': language["current_date"],
+        'current_date': "2024-01-01",
+        'file_type_label': language["file_type"],
+        'file_type': "Python",
+        'toc_title': language["toc_title"]
+    }
+    segments_data = []
+    for _ in range(segment_count):
+        line_from = rng.randint(1, 5000)
+        segments_data.append({
+            'segment_title_main': language["segment_title_main"],
+            'line_from_label': language["line_from"],
+            'line_from': str(line_from),
+            'line_to_label': language["line_to"],
+            'line_to': str(line_from + rng.randint(0, 20)),
+            'description_label': language["description"],
+            'description': " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))),
+            'menu_label': language["menu_label"],
+            'menu_option': language[rng.choice(SEGMENT_TYPES)]
+        })
+    return app_data, segments_data
+
+
+# Collects the structured timing records (see timing.log_timing) logged while
+# a case runs, which gives the time of every phase
+class PhaseRecorder(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.phases = {}
+
+    def emit(self, record):
+        fields = getattr(record, "fields", None)
+        if fields and "timing" in fields:
+            phase = self.phases.setdefault(fields["timing"], {"ms": 0.0})
+            phase["ms"] += fields["ms"]
+            for key, value in fields.items():
+                if key not in ("timing", "ms"):
+                    phase[key] = value
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _hot_spots(profiler):
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    entries = []
+    for (file_name, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        entries.append({"function": f"{os.path.basename(file_name)}:{line}({function})", "calls": calls,
+                        "own_s": round(own, 4), "cumulative_s": round(cumulative, 4)})
+    entries.sort(key=lambda entry: entry["own_s"], reverse=True)
+    return entries[:TOP_ENTRIES]
+
+
+# Render one PDF case. It runs in a fresh worker process so the peak memory
+# and the reportlab import belong to this case only.
+def pdf_case(case, size, language_code, description, out_dir, stream=False, profile_dir=None, trace=False):
+    import tracemalloc
+
+    # The timing records are logged at INFO; only the recorder gets them
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.setLevel(max(handler.level, logging.WARNING))
+    root.setLevel(logging.INFO)
+    recorder = PhaseRecorder()
+    root.addHandler(recorder)
+
+    start = time.perf_counter()
+    import report
+    import_seconds = time.perf_counter() - start
+
+    app_data, segments_data = synthetic_review(size, language=languages()[language_code]["main"], description=description)
+    output_path = os.path.join(out_dir, f"{case}.pdf")
+    if trace:
+        tracemalloc.start(10)
+    profiler = None
+    if profile_dir:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    start = time.perf_counter()
+    if stream:
+        report.generate_pdf_stream(output_path, app_data, iter(segments_data))
+    else:
+        report.generate_pdf(output_path, app_data, segments_data)
+    seconds = time.perf_counter() - start
+
+    result = {
+        "case": case,
+        "segments": size,
+        "language": language_code,
+        "description": description,
+        "mode": "stream" if stream else "full",
+        "profiled": bool(profile_dir),
+        "traced": trace,
+        "seconds": round(seconds, 4),
+        "segments_per_second": round(size / seconds, 1) if seconds else None,
+        "import_s": round(import_seconds, 4),
+        "phases": recorder.phases,
+        "pages": recorder.phases.get("pdf.build", {}).get("pages"),
+        "bytes": os.path.getsize(output_path),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(profile_dir, f"{case}.prof"))
+        result["hot_spots"] = _hot_spots(profiler)
+    if trace:
+        snapshot = tracemalloc.take_snapshot()
+        result["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+        result["allocations"] = [{"site": str(stat.traceback[0]), "kb": round(stat.size / 1024, 1), "count": stat.count}
+                                 for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]]
+    os.remove(output_path)
+    return result
+
+
+def bench_pdf(sizes, language_codes, descriptions, stream=False, profile_dir=None, trace=False):
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for size in sizes:
+            for language_code in language_codes:
+                for description in descriptions:
+                    case = f"pdf-{size}-{language_code}-{description}" + ("-stream" if stream else "")
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        result = executor.submit(pdf_case, case, size, language_code, description, out_dir,
+                                                 stream, profile_dir, trace).result()
+                    print(f"  {case:<32} {result['seconds']:9.3f} s  {result['pages'] or 0:6} pages  "
+                          f"{result['bytes'] / 1024:9.0f} KB  peak {result['peak_rss_mb']} MB", flush=True)
+                    results.append(result)
+    return results
+
+
+# Time one output format: the best and median of a few runs, and the size of
+# the written report
+def bench_format(output_format, app_data, segments_data, out_dir, repeat):
+    output_path = os.path.join(out_dir, f"benchmark{EXTENSIONS[output_format]}")
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_report(output_path, output_format, app_data, iter(segments_data))
+        runs.append(time.perf_counter() - start)
+    return {
+        "format": output_format,
+        "segments": len(segments_data),
+        "best_s": min(runs),
+        "median_s": statistics.median(runs),
+        "segments_per_second": len(segments_data) / min(runs) if min(runs) else 0.0,
+        "bytes": os.path.getsize(output_path),
+    }
+
+
+# Compare the renderers on one review. The text formats run first, so the
+# benchmark also checks that they never load reportlab.
+def bench_renderers(segment_count, repeat, formats):
+    app_data, segments_data = synthetic_review(segment_count)
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for output_format in sorted(formats, key=lambda name: name == "pdf"):
+            if output_format == "pdf":
+                start = time.perf_counter()
+                import report  # noqa: F401
+                import_seconds = time.perf_counter() - start
+            result = bench_format(output_format, app_data, segments_data, out_dir, repeat)
+            if output_format == "pdf":
+                result["import_s"] = import_seconds
+            else:
+                result["reportlab_loaded"] = "reportlab" in sys.modules
+            results.append(result)
+
+    pdf = next((result for result in results if result["format"] == "pdf"), None)
+    for result in results:
+        result["vs_pdf"] = pdf["best_s"] / result["best_s"] if pdf and result["best_s"] else None
+    return results
+
+
+def print_renderers(results):
+    print(f"  {'format':<10} {'segments':>8} {'best s':>9} {'median s':>9} {'segments/s':>11} {'bytes':>11} {'vs pdf':>8}")
+    for result in results:
+        vs_pdf = f"{result['vs_pdf']:.1f}x" if result["vs_pdf"] else "-"
+        print(f"  {result['format']:<10} {result['segments']:>8} {result['best_s']:>9.3f} {result['median_s']:>9.3f} "
+              f"{result['segments_per_second']:>11.0f} {result['bytes']:>11} {vs_pdf:>8}")
+    for result in results:
+        if "import_s" in result:
+            print(f"  reportlab import: {result['import_s'] * 1000:.0f} ms")
+        if result.get("reportlab_loaded"):
+            print(f"  warning: rendering {result['format']} loaded reportlab")
+
+
+# A display for the UI benchmarks: the current one, or a virtual one when the
+# optional pyvirtualdisplay package and Xvfb are installed. Returns the display
+# to stop afterwards (or None) and the reason when there is none.
+def open_display():
+    if sys.platform != "linux" or os.environ.get("DISPLAY"):
+        return None, None
+    try:
+        from pyvirtualdisplay import Display
+    except ImportError:
+        return None, "no display (set DISPLAY or install pyvirtualdisplay and Xvfb)"
+    try:
+        display = Display(visible=False, size=(1200, 900))
+        display.start()
+    except Exception as e:
+        return None, f"virtual display failed: {e}"
+    return display, None
+
+
+# Time adding, scrolling and deleting segments in the virtualized segment list,
+# including the idle-time refresh the UI does after each batch of changes
+def bench_ui(counts):
+    import customtkinter
+    from segment_view import SegmentListView
+
+    app = customtkinter.CTk()
+    app.geometry("1100x800")
+    language = languages()[lang_catalog.FALLBACK_LANGUAGE]["main"]
+    results = []
+    try:
+        for count in counts:
+            view = SegmentListView(app, language)
+            view.place(x=0, y=0)
+            app.update()
+
+            start = time.perf_counter()
+            segment_ids = [view.add() for _ in range(count)]
+            app.update()
+            add_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for offset in range(0, count * 200, max(1, count * 200 // 100)):
+                view.scroll_to(offset)
+                app.update_idletasks()
+            scroll_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for segment_id in segment_ids:
+                view.delete(segment_id)
+            app.update()
+            delete_seconds = time.perf_counter() - start
+
+            results.append({
+                "segments": count,
+                "add_ms_per_segment": round(add_seconds * 1000 / count, 3),
+                "scroll_ms_per_step": round(scroll_seconds * 1000 / 100, 3),
+                "delete_ms_per_segment": round(delete_seconds * 1000 / count, 3),
+                "rows": len(view.rows),
+            })
+            print(f"  {count:>7} segments: add {results[-1]['add_ms_per_segment']:.3f} ms, "
+                  f"delete {results[-1]['delete_ms_per_segment']:.3f} ms per segment, "
+                  f"scroll {results[-1]['scroll_ms_per_step']:.3f} ms per step", flush=True)
+            view.frame.destroy()
+    finally:
+        app.destroy()
+    return results
+
+
+STARTUP_LINE = re.compile(r"^\s+(?P<phase>\S+)\s+(?P<ms>[\d.]+) ms")
+
+
+# Start the app with --startup-report a few times in a scratch directory (so a
+# saved draft is neither used nor changed) and keep the median of every phase
+def bench_startup(repeat):
+    runs = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "dat"))
+        with open(os.path.join(REPO_DIR, "dat", "settings.json"), "rb") as source:
+            with open(os.path.join(work_dir, "dat", "settings.json"), "wb") as target:
+                target.write(source.read())
+        os.symlink(os.path.join(REPO_DIR, "lang"), os.path.join(work_dir, "lang"))
+        for _ in range(repeat):
+            completed = subprocess.run([sys.executable, os.path.join(REPO_DIR, "main.py"), "--startup-report"],
+                                       cwd=work_dir, capture_output=True, text=True, timeout=120)
+            if completed.returncode != 0:
+                raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "startup failed")
+            for line in completed.stdout.splitlines():
+                match = STARTUP_LINE.match(line)
+                if match:
+                    runs.setdefault(match.group("phase"), []).append(float(match.group("ms")))
+    result = {phase: round(statistics.median(values), 1) for phase, values in runs.items()}
+    for phase, ms in result.items():
+        print(f"  {phase:<16}{ms:9.1f} ms")
+    return result
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    # Read from the package metadata: importing reportlab here would spoil the
+    # check that the text renderers do without it
+    try:
+        from importlib.metadata import version
+        reportlab_version = version("reportlab")
+    except Exception:
+        reportlab_version = None
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "reportlab": reportlab_version,
+    }
+
+
+# Print how the PDF cases of this run compare to an earlier results file
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {case["case"]: case for case in json.load(f).get("pdf", [])}
+    print(f"Compared to {baseline_path}:")
+    for case in results.get("pdf", []):
+        old = baseline.get(case["case"])
+        if old is None:
+            continue
+        ratio = case["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        # Profiling and allocation tracing slow a case down many times
+        note = "" if all(bool(case.get(key)) == bool(old.get(key)) for key in ("profiled", "traced")) else "  (profiling differs)"
+        print(f"  {case['case']:<32} {old['seconds']:9.3f} s -> {case['seconds']:9.3f} s  ({ratio:.2f}x){note}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline and the UI on synthetic reviews.")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=SUITES, help="benchmarks to run")
+    parser.add_argument("-n", "--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="segments per review, e.g. 10 1000 100000")
+    parser.add_argument("--languages", nargs="+", help="language codes (default: all in lang/)")
+    parser.add_argument("--descriptions", nargs="+", choices=list(DESCRIPTION_LENGTHS), default=list(DESCRIPTION_LENGTHS))
+    parser.add_argument("--stream", action="store_true", help="time generate_pdf_stream instead of generate_pdf")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per renderer and startup measurement")
+    parser.add_argument("-f", "--formats", nargs="+", choices=["pdf", *RENDERERS], default=["pdf", *RENDERERS],
+                        help="formats compared by the renderers suite")
+    parser.add_argument("--profile", metavar="DIR", help="write a cProfile dump per PDF case and list hot spots")
+    parser.add_argument("--tracemalloc", action="store_true", help="trace allocations of every PDF case (slow)")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="compare the PDF cases with an earlier results file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    language_codes = args.languages or list(languages())
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    results = {"meta": run_metadata()}
+
+    if "pdf" in args.suite:
+        print("PDF:")
+        results["pdf"] = bench_pdf(args.sizes, language_codes, args.descriptions, args.stream, args.profile,
+                                   args.tracemalloc)
+    if "renderers" in args.suite:
+        print("Renderers:")
+        results["renderers"] = bench_renderers(max(args.sizes), args.repeat, args.formats)
+        print_renderers(results["renderers"])
+    if "ui" in args.suite or "startup" in args.suite:
+        display, reason = open_display()
+        try:
+            for suite, bench in (("ui", lambda: bench_ui(args.sizes)), ("startup", lambda: bench_startup(args.repeat))):
+                if suite not in args.suite:
+                    continue
+                print(f"{suite.capitalize()}:")
+                if reason:
+                    print(f"  skipped: {reason}")
+                    results[suite] = {"skipped": reason}
+                    continue
+                results[suite] = bench()
+        finally:
+            if display is not None:
+                display.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import os
+import json
+import logging
+
+SNAPSHOT_PATH = os.path.join("dat", "draft_snapshot.json")
+JOURNAL_PATH = os.path.join("dat", "draft_journal.jsonl")
+
+# The journal is folded into a new snapshot once it is larger than the snapshot
+# itself (and at least this many bytes), so compaction stays a fixed share of
+# the bytes written by autosave
+COMPACT_MIN_BYTES = 256 * 1024
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+# Apply one journal record to the draft state: header is a dict of the header
+# fields, segments a dict of segment ID -> segment in display order
+def apply_record(record, header, segments):
+    op = record["op"]
+    if op == "add":
+        segments[record["id"]] = record["segment"]
+    elif op == "edit":
+        segment = segments.get(record["id"])
+        if segment is not None:
+            segment.update(record["fields"])
+    elif op == "delete":
+        for segment_id in record["ids"]:
+            segments.pop(segment_id, None)
+    elif op == "clear":
+        segments.clear()
+    elif op == "header":
+        header.update(record["fields"])
+    else:
+        raise ValueError(f"Unknown draft record: {op}")
+
+
+# Draft of the review being edited, saved as a snapshot plus an append-only
+# journal of the changes made since. Autosave appends only the records of what
+# changed, so its cost follows the size of the edit, not of the review. The
+# journal starts with the generation of the snapshot it belongs to; a journal
+# left over from an interrupted compaction does not match and is ignored.
+class DraftJournal:
+    def __init__(self, snapshot_path=SNAPSHOT_PATH, journal_path=JOURNAL_PATH, compact_min_bytes=COMPACT_MIN_BYTES):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_min_bytes = compact_min_bytes
+        self.generation = 0
+        self.header = {}
+        self.snapshot_bytes = 0
+        self.journal_bytes = 0
+        self._pending = []
+        self._file = None
+
+    # Read the saved draft and open the journal for appending. Returns the
+    # header fields and the (segment ID, segment) pairs in display order, or
+    # None if there is no draft.
+    def open(self):
+        header, segments = {}, {}
+        found = os.path.exists(self.snapshot_path)
+        if found:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.generation = snapshot["generation"]
+            header.update(snapshot["header"])
+            segments.update((segment_id, segment) for segment_id, segment in snapshot["segments"])
+            self.snapshot_bytes = os.path.getsize(self.snapshot_path)
+
+        valid_bytes = self._replay(header, segments) if os.path.exists(self.journal_path) else 0
+        if valid_bytes:
+            found = True
+            self._file = open(self.journal_path, "r+", encoding="utf-8", newline="\n")
+            self._file.truncate(valid_bytes)
+            self._file.seek(valid_bytes)
+            self.journal_bytes = valid_bytes
+        else:
+            self._start_journal()
+
+        self.header = dict(header)
+        if not found:
+            return None
+        logging.info(f"Draft restored: {len(segments)} segments.")
+        return header, list(segments.items())
+
+    # Replay the journal over the snapshot state. Returns the number of bytes
+    # that are valid; a record cut off by a crash ends the replay.
+    def _replay(self, header, segments):
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        position = 0
+        expect_generation = True
+        while True:
+            end = data.find(b"\n", position)
+            if end == -1:
+                break
+            try:
+                record = json.loads(data[position:end])
+            except ValueError:
+                break
+            if expect_generation:
+                if record.get("generation") != self.generation:
+                    logging.warning("Ignoring a draft journal that does not belong to the snapshot.")
+                    return 0
+                expect_generation = False
+            else:
+                apply_record(record, header, segments)
+            position = end + 1
+        if position < len(data):
+            logging.warning(f"Dropping {len(data) - position} bytes of an incomplete draft record.")
+        return position
+
+    def _start_journal(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, "w", encoding="utf-8", newline="\n")
+        line = _dumps({"generation": self.generation}) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        self.journal_bytes = len(line.encode("utf-8"))
+
+    # Queue a change record (see apply_record). It is serialised right away, so
+    # later changes to the segment do not alter it.
+    def record(self, record):
+        self._pending.append(_dumps(record) + "\n")
+
+    # Queue the header fields that differ from the saved ones
+    def record_header(self, header):
+        changed = {key: value for key, value in header.items() if self.header.get(key) != value}
+        if changed:
+            self.header.update(changed)
+            self.record({"op": "header", "fields": changed})
+
+    # Append the queued records to the journal. Returns the number of records.
+    def flush(self):
+        if not self._pending:
+            return 0
+        count = len(self._pending)
+        data = "".join(self._pending)
+        self._pending = []
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.journal_bytes += len(data.encode("utf-8"))
+        return count
+
+    def needs_compaction(self):
+        return self.journal_bytes > max(self.compact_min_bytes, self.snapshot_bytes)
+
+    # Write the full draft to a new snapshot and start an empty journal. The
+    # snapshot replaces the old one atomically, and the journal written for
+    # the old generation is ignored from then on.
+    def compact(self, items):
+        self._pending = []
+        snapshot = {"generation": self.generation + 1, "header": self.header, "segments": list(items)}
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(_dumps(snapshot))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self.generation += 1
+        self.snapshot_bytes = os.path.getsize(self.snapshot_path)
+        self._start_journal()
+        logging.info(f"Draft compacted: {len(snapshot['segments'])} segments, {self.snapshot_bytes} bytes.")
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
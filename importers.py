@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import logging
+
+from segment_store import new_segment
+
+NOTE, POSSIBLE_PROBLEM, ERROR = "menu_option_note", "menu_option_possible_problem", "menu_option_error"
+
+# Unified diff lines
+DIFF_FILE = re.compile(r"^\+\+\+ (?:b/)?(?P<path>[^\t\n]+)")
+DIFF_OLD_FILE = re.compile(r"^--- (?:a/)?(?P<path>[^\t\n]+)")
+DIFF_HUNK = re.compile(r"^@@ -\d+(?:,(?P<old_count>\d+))? \+(?P<start>\d+)(?:,(?P<count>\d+))? @@ ?(?P<section>.*)")
+
+# flake8 ("path:line:col: E501 message") and pylint ("path:line:col: C0114:
+# message (symbol)") text output
+LINTER_LINE = re.compile(r"^(?P<path>.+?):(?P<line>\d+):(?:(?P<column>\d+):)?\s*(?P<code>[A-Z]+\d+):?\s+(?P<message>.*)$")
+
+# Segment type by the first letter of a linter code (E/F: errors and fatal,
+# W: warnings) and by SARIF level
+CODE_TYPES = {"E": ERROR, "F": ERROR, "W": POSSIBLE_PROBLEM}
+SARIF_LEVELS = {"error": ERROR, "warning": POSSIBLE_PROBLEM}
+
+READ_SIZE = 64 * 1024
+
+
+def _same_file(path, file_name):
+    path = path.replace("\\", "/")
+    file_name = file_name.replace("\\", "/")
+    return path == file_name or path.endswith("/" + file_name) or file_name.endswith("/" + path)
+
+
+# Turn (path, segment) pairs into segments. With a file name only the entries
+# of that file are kept; otherwise the path is put in front of the description.
+def _for_file(entries, file_name):
+    for path, segment in entries:
+        if file_name:
+            if _same_file(path, file_name):
+                yield segment
+        else:
+            segment["description"] = f"{path}: {segment['description']}"
+            yield segment
+
+
+# One segment per hunk of a unified diff (e.g. git diff), covering the changed
+# lines of the new file. The hunk header counts tell where a hunk ends.
+def parse_diff(lines):
+    lines = iter(lines)
+    path = None
+    for line in lines:
+        match = DIFF_FILE.match(line)
+        if match:
+            new_path = match.group("path").strip()
+            if new_path != "/dev/null":
+                path = new_path
+            continue
+        match = DIFF_OLD_FILE.match(line)
+        if match:
+            path = match.group("path").strip()
+            continue
+        match = DIFF_HUNK.match(line)
+        if match is None:
+            continue
+
+        start = int(match.group("start"))
+        old_left = 1 if match.group("old_count") is None else int(match.group("old_count"))
+        new_left = 1 if match.group("count") is None else int(match.group("count"))
+        new_count = new_left
+        added = removed = 0
+        for line in (lines if old_left > 0 or new_left > 0 else ()):
+            if line.startswith("+"):
+                added += 1
+                new_left -= 1
+            elif line.startswith("-"):
+                removed += 1
+                old_left -= 1
+            elif line.startswith("\\"):
+                continue
+            else:
+                old_left -= 1
+                new_left -= 1
+            if old_left <= 0 and new_left <= 0:
+                break
+
+        section = match.group("section").strip()
+        description = f"+{added} -{removed}" + (f" {section}" if section else "")
+        line_to = start + max(new_count, 1) - 1
+        yield path, new_segment(str(start), str(line_to), description, NOTE)
+
+
+# One segment per finding of flake8 or pylint text output. Lines that are not
+# findings (pylint module headers, scores) are skipped.
+def parse_linter_text(lines):
+    for line in lines:
+        match = LINTER_LINE.match(line.rstrip("\n"))
+        if match is None:
+            continue
+        code = match.group("code")
+        description = f"{code} {match.group('message').strip()}"
+        segment_type = CODE_TYPES.get(code[0], NOTE)
+        yield match.group("path"), new_segment(match.group("line"), match.group("line"), description, segment_type)
+
+
+def _sarif_segment(result):
+    location = (result.get("locations") or [{}])[0].get("physicalLocation", {})
+    region = location.get("region", {})
+    start = region.get("startLine")
+    if start is None:
+        return None
+    path = location.get("artifactLocation", {}).get("uri", "")
+    if path.startswith("file://"):
+        path = path[len("file://"):]
+    message = result.get("message", {}).get("text", "")
+    description = f"{result['ruleId']} {message}" if result.get("ruleId") else message
+    segment_type = SARIF_LEVELS.get(result.get("level", "warning"), NOTE)
+    return path, new_segment(str(start), str(region.get("endLine", start)), description, segment_type)
+
+
+# Strings and brackets of a JSON document, for skipping values unread
+JSON_STRUCTURE = re.compile(r'[\[\]{}"]')
+JSON_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+# Reads a JSON document in blocks and walks its structure without decoding it:
+# containers are entered or skipped token by token, and only the values asked
+# for are decoded. Memory is bounded by the largest decoded value.
+class JsonBlockReader:
+    def __init__(self, f, read_size=READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        data = self.f.read(self.read_size)
+        if not data:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+
+    # Next character after whitespace, or "" at the end of the document
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON document")
+        self.pos += 1
+
+    def decode(self):
+        while True:
+            self.peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # A number may go on in the next block
+            if end == len(self.buffer) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    # Skip the next value, reading nested containers only as far as their
+    # strings and brackets
+    def skip(self):
+        if self.peek() not in ("{", "["):
+            self.decode()
+            return
+        depth = 0
+        while True:
+            match = JSON_STRUCTURE.search(self.buffer, self.pos)
+            if match is None:
+                if self.eof:
+                    raise ValueError("Unexpected end of JSON document")
+                self.pos = len(self.buffer)
+                self.fill()
+                continue
+            if match.group() == '"':
+                string = JSON_STRING.match(self.buffer, match.start())
+                if string is None:
+                    if self.eof:
+                        raise ValueError("Unterminated string in JSON document")
+                    # The string goes on in the next block
+                    self.pos = match.start()
+                    self.fill()
+                    continue
+                self.pos = string.end()
+                continue
+            self.pos = match.end()
+            depth += 1 if match.group() in "{[" else -1
+            if depth == 0:
+                return
+
+    # Keys of the object that starts here. The caller reads or skips the value
+    # of each key before asking for the next one.
+    def keys(self):
+        self.expect("{")
+        first = True
+        while True:
+            if self.peek() == "}":
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+            key = self.decode()
+            self.expect(":")
+            yield key
+
+    # Positions of the items of the array that starts here; the caller reads
+    # or skips each item
+    def items(self):
+        self.expect("[")
+        first = True
+        while True:
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+            yield
+
+
+# Decode the results of a SARIF log (runs[*].results) one at a time, reading
+# the file in blocks, so the log never has to fit in memory. Everything else
+# is skipped unread, including "results" keys of property bags; results that
+# are not objects are ignored.
+def iter_sarif_results(f, read_size=READ_SIZE):
+    reader = JsonBlockReader(f, read_size)
+    if reader.peek() != "{":
+        raise ValueError("A SARIF log is a JSON object")
+    for key in reader.keys():
+        if key != "runs" or reader.peek() != "[":
+            reader.skip()
+            continue
+        for _ in reader.items():
+            if reader.peek() != "{":
+                reader.skip()
+                continue
+            for run_key in reader.keys():
+                if run_key != "results" or reader.peek() != "[":
+                    reader.skip()
+                    continue
+                for _ in reader.items():
+                    result = reader.decode()
+                    if isinstance(result, dict):
+                        yield result
+
+
+# One segment per result of a SARIF log (or of a JSON Lines file with one SARIF
+# result per line)
+def parse_sarif(f, json_lines=False):
+    results = (json.loads(line) for line in f if line.strip()) if json_lines else iter_sarif_results(f)
+    for result in results:
+        entry = _sarif_segment(result)
+        if entry is not None:
+            yield entry
+
+
+# Guess the kind of an input file from its name and first line
+def detect_format(input_path, first_line):
+    extension = os.path.splitext(input_path)[1].lower()
+    if extension in (".sarif", ".json"):
+        return "sarif"
+    if extension == ".jsonl":
+        return "sarif-lines"
+    if extension in (".diff", ".patch") or first_line.startswith(("diff ", "--- ", "Index: ")):
+        return "diff"
+    return "linter"
+
+
+# Read segments from a diff, linter or SARIF file as a generator. With
+# file_name only the entries of that file are imported.
+def import_segments(input_path, file_name=None, input_format=None):
+    with open(input_path, "r", encoding="utf-8", errors="replace") as f:
+        if input_format is None:
+            input_format = detect_format(input_path, f.readline())
+            f.seek(0)
+        logging.info(f"Importing segments from {input_path} ({input_format})...")
+        if input_format == "diff":
+            entries = parse_diff(f)
+        elif input_format == "linter":
+            entries = parse_linter_text(f)
+        elif input_format in ("sarif", "sarif-lines"):
+            entries = parse_sarif(f, json_lines=input_format == "sarif-lines")
+        else:
+            raise ValueError(f"Unknown import format: {input_format}")
+        yield from _for_file(entries, file_name)
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import pickle
+import logging
+
+LANG_DIR = "lang"
+CACHE_PATH = os.path.join("dat", "lang_cache.pickle")
+FALLBACK_LANGUAGE = "en"
+CACHE_VERSION = 1
+
+_catalog = None
+
+
+# Stat every language file; the cache is valid as long as this does not change
+def lang_signature(lang_dir=LANG_DIR):
+    signature = {}
+    for file_name in sorted(os.listdir(lang_dir)):
+        if file_name.endswith(".json"):
+            stat = os.stat(os.path.join(lang_dir, file_name))
+            signature[file_name] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+
+# Parse all lang/*.json and lang/*_settings.json files into one catalog:
+# {"languages": {code: {"main": {...}, "settings": {...}}}, "problems": [...]}.
+# Keys missing from a language fall back to English; missing and extra keys
+# are reported as problems.
+def compile_catalog(lang_dir=LANG_DIR):
+    logging.info("Compiling language catalog...")
+    raw = {}
+    for file_name in sorted(os.listdir(lang_dir)):
+        if not file_name.endswith(".json"):
+            continue
+        name = file_name[:-len(".json")]
+        if name.endswith("_settings"):
+            code, part = name[:-len("_settings")], "settings"
+        else:
+            code, part = name, "main"
+        with open(os.path.join(lang_dir, file_name), "r", encoding="utf-8") as f:
+            raw.setdefault(code, {})[part] = json.load(f)
+
+    fallback = raw.get(FALLBACK_LANGUAGE, {})
+    languages = {}
+    problems = []
+    for code, parts in sorted(raw.items()):
+        languages[code] = {}
+        for part in ("main", "settings"):
+            strings = parts.get(part)
+            reference = fallback.get(part, {})
+            if strings is None:
+                problems.append(f"{code}: missing {part} language file")
+                strings = {}
+            missing = sorted(set(reference) - set(strings))
+            extra = sorted(set(strings) - set(reference))
+            if missing:
+                problems.append(f"{code} ({part}): missing keys {', '.join(missing)}")
+            if extra and code != FALLBACK_LANGUAGE:
+                problems.append(f"{code} ({part}): extra keys {', '.join(extra)}")
+            merged = dict(reference)
+            merged.update(strings)
+            languages[code][part] = merged
+
+    for problem in problems:
+        logging.warning(f"Language catalog: {problem}")
+    logging.info(f"Language catalog compiled: {len(languages)} languages.")
+    return {"languages": languages, "problems": problems}
+
+
+# Load the compiled catalog, rebuilding the cache file only when a language
+# file was added, removed or changed since it was written
+def load_catalog(lang_dir=LANG_DIR, cache_path=CACHE_PATH):
+    global _catalog
+    signature = lang_signature(lang_dir)
+    if _catalog is not None and _catalog["signature"] == signature:
+        return _catalog
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("version") == CACHE_VERSION and cached.get("signature") == signature:
+            _catalog = cached
+            return _catalog
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable language cache: {e}")
+
+    catalog = compile_catalog(lang_dir)
+    catalog["version"] = CACHE_VERSION
+    catalog["signature"] = signature
+    try:
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Failed to write language cache: {e}")
+    _catalog = catalog
+    return _catalog
+
+
+def available_languages():
+    return list(load_catalog()["languages"])
+
+
+# Strings of the main window; returns a copy the caller may change
+def get_language(language_code):
+    return dict(_language_parts(language_code)["main"])
+
+
+# Strings of the settings window; returns a copy the caller may change
+def get_settings_language(language_code):
+    return dict(_language_parts(language_code)["settings"])
+
+
+def _language_parts(language_code):
+    languages = load_catalog()["languages"]
+    if language_code not in languages:
+        logging.warning(f"Unknown language {language_code}, falling back to {FALLBACK_LANGUAGE}.")
+        language_code = FALLBACK_LANGUAGE
+    return languages[language_code]
+
+
+# Check every language for missing or extra keys: python lang_catalog.py
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR, format='%(levelname)s - %(message)s')
+    problems = compile_catalog()["problems"]
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problem(s) found." if problems else "All languages are complete.")
+    sys.exit(1 if problems else 0)
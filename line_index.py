@@ -0,0 +1,144 @@
+import logging
+
+
+# Parse the line range of a segment. line_to may be empty (a single line) and a
+# reversed range is swapped. Raises ValueError for anything that is not a pair
+# of positive line numbers.
+def parse_range(line_from, line_to=""):
+    try:
+        first = int(str(line_from).strip())
+        last = int(str(line_to).strip()) if str(line_to).strip() else first
+    except ValueError:
+        raise ValueError(f"Not a line range: {line_from!r} - {line_to!r}") from None
+    if first < 1 or last < 1:
+        raise ValueError(f"Line numbers start at 1: {line_from!r} - {line_to!r}")
+    return (first, last) if first <= last else (last, first)
+
+
+# Whether a segment's range can be shown as valid: empty fields (not filled in
+# yet) count as valid
+def range_is_valid(line_from, line_to=""):
+    if not str(line_from).strip() and not str(line_to).strip():
+        return True
+    try:
+        parse_range(line_from, line_to)
+    except ValueError:
+        return False
+    return True
+
+
+# Static index of line ranges. The ranges are kept sorted by start, and the
+# sorted array is read as an implicit balanced tree (the middle of every slice
+# is its root) in which each root stores the largest end of its slice. A query
+# skips every slice whose largest end lies before the queried line, so it runs
+# in O(log n + k) for k results. Build it again after the ranges changed.
+class RangeIndex:
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: (entry[0], entry[1]))
+        self.starts = [entry[0] for entry in entries]
+        self.ends = [entry[1] for entry in entries]
+        self.items = [entry[2] for entry in entries]
+        self._max_end = [0] * len(entries)
+        self._build(0, len(entries))
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, low, high):
+        if low >= high:
+            return 0
+        middle = (low + high) // 2
+        self._max_end[middle] = max(self.ends[middle], self._build(low, middle), self._build(middle + 1, high))
+        return self._max_end[middle]
+
+    # Items whose range overlaps first..last (inclusive), in start order
+    def overlapping(self, first, last):
+        found = []
+        self._search(0, len(self.items), first, last, found)
+        return found
+
+    # Items whose range contains the line
+    def touching(self, line):
+        return self.overlapping(line, line)
+
+    def _search(self, low, high, first, last, found):
+        if low >= high:
+            return
+        middle = (low + high) // 2
+        if self._max_end[middle] < first:
+            return
+        self._search(low, middle, first, last, found)
+        # Everything right of a range starting after last starts after it too
+        if self.starts[middle] > last:
+            return
+        if self.ends[middle] >= first:
+            found.append(self.items[middle])
+        self._search(middle + 1, high, first, last, found)
+
+    # Items sorted by range
+    def sorted(self):
+        return list(self.items)
+
+    # Groups of ranges that overlap one another directly or through other
+    # ranges, as (first, last, items) in line order
+    def groups(self):
+        groups = []
+        for start, end, item in zip(self.starts, self.ends, self.items):
+            if groups and start <= groups[-1][1]:
+                group = groups[-1]
+                group[1] = max(group[1], end)
+                group[2].append(item)
+            else:
+                groups.append([start, end, [item]])
+        return [tuple(group) for group in groups]
+
+
+# Index the segments of a review by their line range. The items of the index
+# are (first, last, position) tuples; also returns the positions of segments
+# without a valid range.
+def index_segments(segments):
+    entries = []
+    invalid = []
+    for position, segment in enumerate(segments):
+        try:
+            first, last = parse_range(segment['line_from'], segment['line_to'])
+        except ValueError:
+            invalid.append(position)
+            continue
+        entries.append((first, last, (first, last, position)))
+    return RangeIndex(entries), invalid
+
+
+# Order the gathered segments of a report by line range. Findings with the
+# same range, description and type are merged into the first one. With
+# group_overlaps, the first segment of every group of two or more overlapping
+# segments gets an "overlap_group" entry [first, last, size] that the report
+# shows as a heading. Segments without a valid range follow in their original
+# order.
+def arrange_segments(segments, merge_duplicates=True, group_overlaps=True):
+    segments = list(segments)
+    index, invalid = index_segments(segments)
+    arranged = []
+    seen = set()
+    duplicates = 0
+    overlap_groups = 0
+    for first, last, entries in index.groups():
+        group = []
+        for entry_first, entry_last, position in entries:
+            segment = segments[position]
+            if merge_duplicates:
+                description = " ".join(segment['description'].split()).casefold()
+                key = (entry_first, entry_last, description, segment['menu_option'])
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+            group.append(segment)
+        if group_overlaps and len(group) > 1:
+            group[0] = dict(group[0], overlap_group=[first, last, len(group)])
+            overlap_groups += 1
+        arranged.extend(group)
+    arranged.extend(segments[position] for position in invalid)
+    logging.info(f"Arranged {len(segments)} segments by line: {duplicates} duplicates merged, "
+                 f"{overlap_groups} overlap groups, {len(invalid)} without a valid range.")
+    return arranged
@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import gzip
+import json
+import platform
+import datetime
+from urllib.parse import quote
+
+# Every log record starts with the asctime written by applog.LOG_FORMAT;
+# lines without it (tracebacks) belong to the record above them
+RECORD_START = re.compile(rb"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - ", re.MULTILINE)
+RECORD_PREFIX_LENGTH = 26
+
+# First record written when the app starts, used to find the last session
+SESSION_MARKER = "Initializing UI..."
+
+BLOCK_SIZE = 8192
+
+# Default limits: how much of the log is read for the e-mail and for the
+# attachment, and how long the mailto: URL may get before mail clients start
+# truncating it
+EMAIL_MAX_RECORDS = 200
+EMAIL_MAX_BYTES = 256 * 1024
+BUNDLE_MAX_RECORDS = 20000
+BUNDLE_MAX_BYTES = 4 * 1024 * 1024
+MAILTO_BUDGET = 2000
+
+
+# Read the last max_records records of a log file by seeking backwards from its
+# end in blocks. At most max_bytes are read, however large the file is.
+def tail_records(log_path, max_records=EMAIL_MAX_RECORDS, max_bytes=EMAIL_MAX_BYTES):
+    with open(log_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = position = f.tell()
+        data = b""
+        found = 0
+        while position > 0 and end - position < max_bytes and found <= max_records:
+            step = min(BLOCK_SIZE, position, max_bytes - (end - position))
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+            found += sum(1 for match in RECORD_START.finditer(data, 0, step + RECORD_PREFIX_LENGTH) if match.start() < step)
+
+    # The first line may be cut off unless the start of the file was reached
+    starts = [match.start() for match in RECORD_START.finditer(data)]
+    if position > 0 and starts and starts[0] == 0:
+        starts = starts[1:]
+    records = [data[start:stop].decode("utf-8", errors="replace").rstrip("\n")
+               for start, stop in zip(starts, starts[1:] + [len(data)])]
+    return records[-max_records:]
+
+
+# Keep only the records of the last application session
+def last_session(records):
+    for index in range(len(records) - 1, -1, -1):
+        if SESSION_MARKER in records[index]:
+            return records[index:]
+    return records
+
+
+# Summarise the structured timing records (see timing.log_timing) in an excerpt
+def timing_summary(records):
+    summary = {}
+    for record in records:
+        if " - timing " not in record:
+            continue
+        try:
+            fields = json.loads(record[record.index("{"):])
+        except ValueError:
+            continue
+        entry = summary.setdefault(fields.get("timing"), {"count": 0, "max_ms": 0.0, "total_ms": 0.0})
+        entry["count"] += 1
+        entry["max_ms"] = max(entry["max_ms"], fields.get("ms", 0.0))
+        entry["total_ms"] += fields.get("ms", 0.0)
+    return summary
+
+
+# A few facts about the environment that help to reproduce an issue
+def environment_facts(log_path, records):
+    facts = [
+        f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Platform: {platform.platform()}",
+        f"Python: {sys.version.split()[0]}",
+        f"Log size: {os.path.getsize(log_path) if os.path.exists(log_path) else 0} bytes",
+        f"Records in excerpt: {len(records)}",
+    ]
+    for name, entry in sorted(timing_summary(records).items(), key=lambda item: str(item[0])):
+        facts.append(f"Timing {name}: {entry['count']}x, avg {entry['total_ms'] / entry['count']:.1f} ms, max {entry['max_ms']:.1f} ms")
+    return facts
+
+
+def _excerpt_text(intro, facts, records):
+    return "\n".join([intro, "", *facts, "", *records])
+
+
+# Build a mailto: link whose URL-encoded length stays within budget. The oldest
+# records are dropped until it fits; returns the link and how many records it holds.
+def build_mailto(email, subject, intro, facts, records, budget=MAILTO_BUDGET):
+    prefix = f"mailto:{email}?subject={quote(subject)}&body="
+
+    def link(count):
+        return prefix + quote(_excerpt_text(intro, facts, records[len(records) - count:]))
+
+    low, high = 0, len(records)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(link(middle)) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return link(low), low
+
+
+# Write the last session with the environment facts to a gzip file that can be
+# attached to the e-mail
+def write_bundle(bundle_path, intro, facts, records):
+    with gzip.open(bundle_path, "wt", encoding="utf-8") as f:
+        f.write(_excerpt_text(intro, facts, records))
+        f.write("\n")
+    return bundle_path
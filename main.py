@@ -1,24 +1,26 @@
+import timing  # Imported first so the startup timing covers all other imports
 import customtkinter
 import os
 import json
+import time
 import datetime
-import subprocess
+import importlib
+import threading
 import webbrowser
 import logging  # Import logging module for logging
 import sys
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.graphics.shapes import Drawing, Line
+import applog
+import drafts
+import lang_catalog
+from importers import import_segments
+from segment_view import SegmentListView
+from settings import open_settings_window
 
-# Set up logging
-log_path = os.path.join("dat", "app.log")
-logging.basicConfig(filename=log_path, level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+timing.mark("imports")
+
+# Set up logging: records are written to a rotating dat/app.log by a background thread
+applog.setup_logging()
 
 # Load settings
 def load_settings():
@@ -35,11 +37,9 @@ def load_settings():
 
 def load_language(language_code):
     try:
-        logging.info(f"Loading language file for: {language_code}")
-        lang_path = os.path.join("lang", f"{language_code}.json")
-        with open(lang_path, "r") as f:
-            language = json.load(f)
-        logging.info("Language file loaded successfully.")
+        logging.info(f"Loading language for: {language_code}")
+        language = lang_catalog.get_language(language_code)
+        logging.info("Language loaded successfully.")
         return language
     except Exception as e:
         logging.error(f"Failed to load language file: {e}")
@@ -49,6 +49,7 @@ def load_language(language_code):
 # Load the settings and language
 settings = load_settings()
 language = load_language(settings["language"])
+timing.mark("settings")
 
 # Initialize the UI
 logging.info("Initializing UI...")
@@ -81,6 +82,14 @@ email_button.place(x=10, y=100)
 settings_button = customtkinter.CTkButton(master=side_bar_frame, text=language["settings_button"], command=lambda: open_settings())
 settings_button.place(x=10, y=140)
 
+# Button to import segments from a diff or linter report
+import_button = customtkinter.CTkButton(master=side_bar_frame, text=language["import_button"], command=lambda: import_review_segments())
+import_button.place(x=10, y=180)
+
+# Button to discard the current review and its draft
+new_review_button = customtkinter.CTkButton(master=side_bar_frame, text=language["new_review_button"], command=lambda: new_review())
+new_review_button.place(x=10, y=220)
+
 # Label for Author Information
 author_label = customtkinter.CTkLabel(master=side_bar_frame, text=language["author_info"], font=("Arial", 13, "italic"))
 author_label.place(x=30, y=710)
@@ -91,20 +100,18 @@ def open_github():
     webbrowser.open("https://github.com/samuel-lab")  # Replace with your actual GitHub URL
     logging.info("GitHub opened successfully.")
 
-# Function to open the settings.py file
+# Function to open the settings window inside the running application
+settings_window = None
 
 def open_settings():
+    global settings_window
     try:
         logging.info("Opening settings...")
-        # Get the current Python interpreter
-        python_executable = sys.executable
-        # Get the absolute path to the settings.py script
-        script_path = os.path.abspath("settings.py")
-        # Run the settings.py script using the current Python interpreter
-        subprocess.run([python_executable, script_path], check=True)
+        if settings_window is not None and settings_window.winfo_exists():
+            settings_window.focus()
+            return
+        settings_window = open_settings_window(app, settings, on_language_change=change_language)
         logging.info("Settings opened successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to open settings: {e}")
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
 
@@ -156,76 +163,78 @@ file_type_dropdown.place(x=520, y=90)
 complete_button = customtkinter.CTkButton(master=header_frame, text=language["complete_button"], command=lambda: generate_pdf_from_form())
 complete_button.place(x=760, y=75)
 
-# Scrollable frame for segments
-segments_frame_main = customtkinter.CTkScrollableFrame(master=app, width=890, height=570)
-segments_frame_main.place(x=180, y=150)
-
-segments = []
-
-# Function to delete a segment
-def delete_segment(frame, segment_index):
-    logging.info(f"Deleting segment {segment_index + 1}...")
-    frame.destroy()
-    segments.pop(segment_index)
-    update_segment_numbers()
-    logging.info(f"Segment {segment_index + 1} deleted.")
-
-# Function to update segment numbers after deletion
-def update_segment_numbers():
-    logging.info("Updating segment numbers...")
-    for index, segment in enumerate(segments):
-        segment['number_label'].configure(text=f"{language['segment_title_main']} {index + 1}")
-    logging.info("Segment numbers updated.")
+# Status of the background PDF render; its Cancel button is built on first use
+cancel_button = None
+render_status_label = customtkinter.CTkLabel(master=header_frame, text="", font=("Arial", 11))
+render_status_label.place(x=760, y=103)
+
+# Virtualized list of segments: a small pool of row widgets is filled from the
+# segment data as the user scrolls
+segment_view = SegmentListView(app, language)
+segment_view.place(x=180, y=150)
+
+# Widgets whose text comes from the language file
+localized_widgets = [
+    (menu_title_label, "menu_title"),
+    (github_button, "github_button"),
+    (email_button, "email_button"),
+    (settings_button, "settings_button"),
+    (import_button, "import_button"),
+    (new_review_button, "new_review_button"),
+    (author_label, "author_info"),
+    (title_label, "app_title"),
+    (file_name_label, "file_name"),
+    (controller_name_label, "controller_name"),
+    (current_date_label, "current_date"),
+    (file_type_label, "file_type"),
+    (complete_button, "complete_button"),
+]
+
+# Function to switch the language while the app is running: the existing
+# widgets are re-labelled in place instead of being re-created
+def change_language(language_code):
+    logging.info(f"Switching language to: {language_code}")
+    new_language = load_language(language_code)
+    # Save the rows while their type labels are still in the old language
+    segment_view.flush()
+    language.clear()
+    language.update(new_language)
+    app.title(language["title"])
+    for widget, key in localized_widgets:
+        widget.configure(text=language[key])
+    if cancel_button is not None:
+        cancel_button.configure(text=language["cancel_button"])
+    render_status_label.configure(text="")
+    segment_view.set_language(language)
+    logging.info("Language switched.")
 
 # Function to add a new segment
 def add_segment():
     logging.info("Adding new segment...")
-    segment_index = len(segments)
-    segments_frame = customtkinter.CTkFrame(master=segments_frame_main, width=880, height=180, fg_color="#404040")
-    segments_frame.pack(pady=10, padx=10)
-    
-    # Number Label
-    number_label = customtkinter.CTkLabel(master=segments_frame, text=f"{language['segment_title_main']} {segment_index + 1}")
-    number_label.place(x=10, y=10)
-    
-    # "Line From" Entry
-    line_from_label = customtkinter.CTkLabel(master=segments_frame, text=language["line_from"])
-    line_from_label.place(x=10, y=40)
-    line_from_entry = customtkinter.CTkEntry(master=segments_frame, width=100)
-    line_from_entry.place(x=100, y=40)
-    
-    # "Line To" Entry
-    line_to_label = customtkinter.CTkLabel(master=segments_frame, text=language["line_to"])
-    line_to_label.place(x=10, y=70)
-    line_to_entry = customtkinter.CTkEntry(master=segments_frame, width=100)
-    line_to_entry.place(x=100, y=70)
-    
-    # "Description" Entry with scrolling and wrapping
-    description_label = customtkinter.CTkLabel(master=segments_frame, text=language["description"])
-    description_label.place(x=220, y=10)
-    description_textbox = customtkinter.CTkTextbox(master=segments_frame, width=620, height=100, wrap="word")
-    description_textbox.place(x=220, y=40)
-    
-    # Setting scrolling to top-right corner and starting cursor at the top
-    description_textbox.insert("1.0", "")  # To ensure the cursor starts at the top
-    description_textbox.yview_moveto(0)  # Move the scrollbar to the top
-    description_textbox.xview_moveto(0)  # Move the scrollbar to the far left
-    
-    # Dropdown Menu for segment type
-    menu_label = customtkinter.CTkLabel(master=segments_frame, text=language["menu_label"])
-    menu_label.place(x=10, y=110)
-    menu_options = [language["menu_option_note"], language["menu_option_possible_problem"], language["menu_option_error"]]
-    menu_var = customtkinter.StringVar(value=menu_options[0])
-    menu_dropdown = customtkinter.CTkOptionMenu(master=segments_frame, variable=menu_var, values=menu_options)
-    menu_dropdown.place(x=10, y=140)
-
-    # Delete Button to remove a segment
-    delete_button = customtkinter.CTkButton(master=segments_frame, text=language["delete_button"], command=lambda: delete_segment(segments_frame, segment_index))
-    delete_button.place(x=720, y=145)
-    
-    segments.append({"frame": segments_frame, "number_label": number_label, "line_from_entry": line_from_entry, "line_to_entry": line_to_entry, "description_textbox": description_textbox, "menu_var": menu_var})
-    update_segment_numbers()
-    logging.info(f"Segment {segment_index + 1} added.")
+    segment_id = segment_view.add()
+    logging.info(f"Segment #{segment_id} added.")
+
+# Function to import segments from a git diff, flake8/pylint output or a SARIF
+# log. The input is parsed as a stream and inserted in one batch; only the
+# visible rows get widgets. With a file name in the header, only the findings
+# of that file are imported.
+def import_review_segments():
+    from tkinter import filedialog
+
+    input_path = filedialog.askopenfilename(parent=app, title=language["import_title"], filetypes=[
+        ("Diff, linter report, SARIF", "*.diff *.patch *.txt *.log *.sarif *.json *.jsonl"),
+        ("*", "*"),
+    ])
+    if not input_path:
+        return
+    try:
+        file_name = file_name_entry.get().strip() or None
+        with timing.timed("segment.import") as fields:
+            segment_ids = segment_view.add_many(import_segments(input_path, file_name))
+            fields["segments"] = len(segment_ids)
+        logging.info(f"Imported {len(segment_ids)} segments from {input_path}.")
+    except Exception as e:
+        logging.error(f"Failed to import segments: {e}")
 
 # Function to display information in a pop-up window
 def show_information():
@@ -263,10 +272,14 @@ def show_information():
     close_button.pack(pady=(10, 20))
     logging.info("Information window displayed.")
 
-# Function to generate PDF from form data
-def generate_pdf_from_form():
-    logging.info("Generating PDF from form data...")
-    # Gather data from the form
+# Function to snapshot the form data on the UI thread
+def gather_form_data():
+    with timing.timed("form.gather") as fields:
+        app_data, segments_data = read_form()
+        fields["segments"] = len(segments_data)
+    return app_data, segments_data
+
+def read_form():
     app_data = {
         'app_title': language["app_title"],
         'file_name_label': language["file_name"],
@@ -276,15 +289,17 @@ def generate_pdf_from_form():
         'current_date_label': language["current_date"],
         'current_date': datetime.datetime.now().strftime("%Y-%m-%d"),
         'file_type_label': language["file_type"],
-        'file_type': file_type_var.get()
+        'file_type': file_type_var.get(),
+        'toc_title': language["toc_title"]
     }
     
     segments_data = []
-    for segment in segments:
-        line_from = segment["line_from_entry"].get()
-        line_to = segment["line_to_entry"].get() or line_from  # Use line_from if line_to is empty
-        description = segment["description_textbox"].get("1.0", "end").strip()
-        menu_option = segment["menu_var"].get()
+    segment_view.flush()
+    for segment in segment_view.store:
+        line_from = segment["line_from"]
+        line_to = segment["line_to"] or line_from  # Use line_from if line_to is empty
+        description = segment["description"].strip()
+        menu_option = language[segment["type"]]
         
         segment_data = {
             'segment_title_main': language["segment_title_main"],
@@ -299,100 +314,160 @@ def generate_pdf_from_form():
         }
         segments_data.append(segment_data)
     
-    # Always save the PDF as output.pdf
-    output_path = 'output.pdf'
-    
-    # Generate the PDF
-    generate_pdf(output_path, app_data, segments_data)
-    logging.info(f"PDF generated and saved to {output_path}")
-
-# Function to generate the actual PDF
-def generate_pdf(output_path, app_data, segments_data):
-    logging.info(f"Creating PDF document at {output_path}...")
-    # Create a PDF document
-    pdf = SimpleDocTemplate(output_path, pagesize=A4, title=app_data['app_title'], author="Your App")
-    
-    # Use sample stylesheet from reportlab
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        name="TitleStyle",
-        fontSize=24,
-        leading=28,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor("#4B8BBE"),
-        fontName="Helvetica-Bold"
-    )
+    return app_data, segments_data
 
-    header_style = ParagraphStyle(
-        name="HeaderStyle",
-        fontSize=14,
-        leading=18,
-        alignment=TA_LEFT,
-        textColor=colors.HexColor("#306998"),
-        fontName="Helvetica-Bold"
-    )
+current_render = None
 
-    normal_style = ParagraphStyle(
-        name="NormalStyle",
-        fontSize=12,
-        leading=15,
-        alignment=TA_LEFT,
-        textColor=colors.black,
-        fontName="Helvetica"
-    )
+# Function to generate PDF from form data. The form is snapshotted here and the
+# PDF is rendered on a background thread; clicking Complete again supersedes a
+# render that is still running.
+def generate_pdf_from_form():
+    global current_render, cancel_button
+    from render_job import RenderJob
+    from renderers import EXTENSIONS
 
-    # Elements to be added to the PDF
-    elements = []
+    logging.info("Generating PDF from form data...")
+    app_data, segments_data = gather_form_data()
+
+    if current_render is not None and not current_render.finished:
+        current_render.cancel()
+
+    # Optionally order the segments by line range and group overlapping ones
+    if settings.get("report_order") == "lines":
+        from line_index import arrange_segments
+        segments_data = arrange_segments(segments_data, group_overlaps=settings.get("report_group_overlaps", True))
+
+    # Always save the report as output.pdf (or output.md etc. for another report_format)
+    output_format = settings.get("report_format", "pdf")
+    output_path = f"output{EXTENSIONS[output_format]}"
+
+    # Generate the report in the background
+    current_render = RenderJob(output_path, app_data, segments_data, template=settings.get("report_theme"),
+                               output_format=output_format).start()
+    if cancel_button is None:
+        cancel_button = customtkinter.CTkButton(master=header_frame, text=language["cancel_button"], command=cancel_render, width=140)
+    cancel_button.place(x=760, y=40)
+    app.after(100, poll_render, current_render)
+
+# Function to show the progress of a background render
+def poll_render(job):
+    from render_job import DONE, CANCELLED
+
+    if job is not current_render:
+        return
+    if not job.finished:
+        render_status_label.configure(text=f"{language['render_progress']} {job.segments_done}/{job.total_segments}, {job.pages_done} {language['render_pages']}")
+        app.after(100, poll_render, job)
+        return
+    cancel_button.place_forget()
+    if job.state == DONE:
+        render_status_label.configure(text=language["render_done"])
+        logging.info(f"PDF generated and saved to {job.output_path}")
+        if settings.get("index_reports", True):
+            threading.Thread(target=index_report, args=(job,), daemon=True).start()
+    elif job.state == CANCELLED:
+        render_status_label.configure(text=language["render_cancelled"])
+    else:
+        render_status_label.configure(text=language["render_failed"])
+
+# Function to record a finished report in the searchable review index
+def index_report(job):
+    try:
+        import review_index
+        review_index.record_report(job.app_data, job.segments_data, job.output_path)
+    except Exception as e:
+        logging.error(f"Failed to index the report: {e}")
 
-    # Add title
-    title = Paragraph(f"{app_data['app_title']}", title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 0.3 * inch))
-    
-    # Add file and controller name info
-    elements.append(Paragraph(f"<strong>{app_data['file_name_label']}:</strong> {app_data['file_name']}", normal_style))
-    elements.append(Paragraph(f"<strong>{app_data['controller_name_label']}:</strong> {app_data['controller_name']}", normal_style))
-    elements.append(Paragraph(f"<strong>{app_data['current_date_label']}:</strong> {app_data['current_date']}", normal_style))
-    elements.append(Paragraph(f"<strong>{app_data['file_type_label']}:</strong> {app_data['file_type']}", normal_style))
-    elements.append(Spacer(1, 0.3 * inch))
-
-    # Iterate over each segment and add its data
-    for index, segment in enumerate(segments_data):
-        # Segment Title
-        segment_title = Paragraph(f"{segment['segment_title_main']} {index + 1}", header_style)
-        elements.append(segment_title)
-        elements.append(Spacer(1, 0.1 * inch))
-        
-        # Line Info
-        line_info = Paragraph(f"{segment['line_from_label']} {segment['line_from']} - {segment['line_to_label']} {segment['line_to']}", normal_style)
-        elements.append(line_info)
-        elements.append(Spacer(1, 0.05 * inch))
-        
-        # Description
-        description = Paragraph(f"<strong>{segment['description_label']}:</strong> {segment['description']}", normal_style)
-        elements.append(description)
-        elements.append(Spacer(1, 0.05 * inch))
-        
-        # Menu Option
-        menu_option = Paragraph(f"<strong>{segment['menu_label']}:</strong> {segment['menu_option']}", normal_style)
-        elements.append(menu_option)
-        
-        # Add a thin line to separate segments
-        elements.append(Spacer(1, 0.2 * inch))
-        d = Drawing(500, 1)
-        d.add(Line(0, 0, 500, 0))
-        elements.append(d)
-        elements.append(Spacer(1, 0.2 * inch))
+# Function to cancel the running render
+def cancel_render():
+    if current_render is not None and not current_render.finished:
+        logging.info("Cancelling PDF generation...")
+        current_render.cancel()
 
-    # Build the PDF
-    pdf.build(elements)
-    logging.info(f"PDF built successfully and saved to {output_path}.")
+# Draft of the review: restored on start and autosaved as a journal of the
+# changes, so a crash or restart does not lose the session
+AUTOSAVE_MS = 2000
+draft = drafts.DraftJournal()
 
-# Add the initial 2 segments when the application starts
-for _ in range(2):
-    add_segment()
+def header_fields():
+    return {
+        'file_name': file_name_entry.get(),
+        'controller_name': controller_name_entry.get(),
+        'file_type': file_type_var.get()
+    }
+
+# Function to restore the saved draft; returns False if there is none
+def restore_draft():
+    try:
+        with timing.timed("draft.restore") as fields:
+            saved = draft.open()
+            if saved is not None:
+                header, items = saved
+                file_name_entry.insert(0, header.get('file_name', ''))
+                controller_name_entry.insert(0, header.get('controller_name', ''))
+                file_type_var.set(header.get('file_type', file_type_options[0]))
+                segment_view.restore(items)
+                fields["segments"] = len(items)
+    except Exception as e:
+        logging.error(f"Failed to restore the draft, starting a new one: {e}")
+        saved = None
+        segment_view.clear()
+        draft.compact([])
+    segment_view.store.on_change = draft.record
+    return saved is not None
+
+# Function to append the changes made since the last autosave to the draft
+def autosave():
+    try:
+        start = time.perf_counter()
+        segment_view.flush()
+        draft.record_header(header_fields())
+        records = draft.flush()
+        if records:
+            timing.log_timing("draft.autosave", time.perf_counter() - start, records=records)
+        if draft.needs_compaction():
+            with timing.timed("draft.compact", segments=len(segment_view.store)):
+                draft.compact(segment_view.store.items())
+    except Exception as e:
+        logging.error(f"Autosave failed: {e}")
+
+# Function to start a new review: the header and segments are cleared and the
+# draft is compacted to the empty review, so the next start does not restore
+# the old one
+def new_review():
+    from tkinter import messagebox
+
+    if not messagebox.askyesno(language["new_review_button"], language["new_review_confirm"], parent=app):
+        return
+    logging.info("Starting a new review...")
+    segment_view.clear()
+    file_name_entry.delete(0, "end")
+    controller_name_entry.delete(0, "end")
+    file_type_var.set(file_type_options[0])
+    render_status_label.configure(text="")
+    try:
+        draft.record_header(header_fields())
+        draft.compact([])
+    except Exception as e:
+        logging.error(f"Failed to discard the draft: {e}")
+    for _ in range(2):
+        add_segment()
+
+def schedule_autosave():
+    autosave()
+    app.after(AUTOSAVE_MS, schedule_autosave)
+
+# Function to save the draft one last time when the window is closed
+def on_close():
+    autosave()
+    app.destroy()
+
+# Restore the draft, or add the initial 2 segments when there is none
+if not restore_draft():
+    for _ in range(2):
+        add_segment()
+app.after(AUTOSAVE_MS, schedule_autosave)
+app.protocol("WM_DELETE_WINDOW", on_close)
 
 # Add Segment Button
 add_segment_button = customtkinter.CTkButton(master=app, text=language["add_segment_button"], command=add_segment, width=800)
@@ -401,8 +476,48 @@ add_segment_button.place(x=180, y=760)
 # Information Button
 info_button = customtkinter.CTkButton(master=app, text=language["information_button"], command=show_information, width=100)
 info_button.place(x=990, y=760)
+localized_widgets += [(add_segment_button, "add_segment_button"), (info_button, "information_button")]
+
+timing.mark("ui")
+
+# Function to load the renderer on a background thread, so the first click on
+# Complete does not pay for the import. reportlab is only loaded for PDF output.
+def warm_up_renderer():
+    start = time.perf_counter()
+    importlib.import_module("report" if settings.get("report_format", "pdf") == "pdf" else "render_job")
+    timing.record("renderer_warmup", time.perf_counter() - start)
+
+# Function to run once the first frame is drawn. With --startup-report the
+# timing is printed and the app exits; --startup-budget-ms=N additionally
+# exits with status 1 when the first paint took longer than N ms.
+startup_exit_code = 0
+
+def on_first_paint():
+    global startup_exit_code
+    app.update_idletasks()
+    timing.mark("first_paint")
+    warm_up_thread = threading.Thread(target=warm_up_renderer, daemon=True)
+    warm_up_thread.start()
+    if "--startup-report" not in sys.argv:
+        timing.log_startup_report()
+        return
+    warm_up_thread.join()
+    timing.log_startup_report()
+    print(timing.startup_report())
+    for arg in sys.argv:
+        if arg.startswith("--startup-budget-ms="):
+            budget_ms = float(arg.split("=", 1)[1])
+            first_paint_ms = timing.startup_phases()[-1]["total_ms"]
+            if first_paint_ms > budget_ms:
+                print(f"First paint took {first_paint_ms:.1f} ms, over the budget of {budget_ms:.1f} ms")
+                startup_exit_code = 1
+    app.destroy()
+
+app.after(0, on_first_paint)
 
 # Start the Tkinter event loop
 logging.info("Starting the application...")
 app.mainloop()
+draft.close()
 logging.info("Application closed.")
+sys.exit(startup_exit_code)
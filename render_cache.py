@@ -0,0 +1,98 @@
+import os
+import copy
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Number of segments whose flowables are kept
+DEFAULT_MAX_ENTRIES = 4096
+
+
+# Identity of the source file that excerpts are read from. It includes the
+# modification time and size, so excerpts of an edited file are not reused.
+def source_fingerprint(source_path):
+    if not source_path:
+        return None
+    stat = os.stat(source_path)
+    return (os.path.abspath(source_path), stat.st_mtime_ns, stat.st_size)
+
+
+# Shallow copies of flowables for one use in a story. reportlab never clears
+# the mark it leaves on a flowable it had to move to the next page, and a
+# second move would fail, so the copies start without it.
+def copy_flowables(flowables):
+    copies = []
+    for flowable in flowables:
+        flowable = copy.copy(flowable)
+        flowable.__dict__.pop("_postponed", None)
+        copies.append(flowable)
+    return copies
+
+
+# LRU cache of the flowables of a segment below its title, keyed by a hash of
+# the segment dict (which includes the language labels), the report template
+# and the source file. Every use gets its own copies of the cached flowables,
+# since reportlab marks the flowables it lays out and one object must not
+# appear twice in a story or in two renders at once. The copies share the
+# line breaking their paragraphs measured, so a re-render of a mostly
+# unchanged review only breaks the changed segments into lines again.
+class RenderCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, segment, template, source_path):
+        content = json.dumps(segment, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        return (digest, template.fingerprint, source_fingerprint(source_path))
+
+    # Flowables of a segment body, built with build(segment, template, source_path)
+    # on a miss
+    def segment_body(self, segment, template, source_path, build):
+        key = self._key(segment, template, source_path)
+        with self._lock:
+            flowables = self._entries.get(key)
+            if flowables is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy_flowables(flowables)
+            self.misses += 1
+
+        # The built flowables stay in the cache untouched, as prototypes
+        flowables = build(segment, template, source_path)
+        with self._lock:
+            self._entries[key] = flowables
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return copy_flowables(flowables)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.reset_stats()
+
+
+# Cache shared by all renders of this process
+shared_cache = RenderCache()
@@ -0,0 +1,105 @@
+import os
+import time
+import logging
+import threading
+import itertools
+
+from render_cache import shared_cache
+from renderers import render_report
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Only a job started later than the one that last wrote a file may replace it
+_replace_lock = threading.Lock()
+_last_written = {}
+_job_numbers = itertools.count(1)
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+# Renders one report on a background thread. The PDF is written to a
+# temporary file next to output_path and renamed over it only when the render
+# finished, so an interrupted or superseded render never leaves a broken file.
+# Progress is kept in plain attributes the UI thread can poll. Formats other
+# than PDF are written by the renderers module and do not load reportlab.
+class RenderJob:
+    def __init__(self, output_path, app_data, segments_data, template=None, output_format="pdf"):
+        self.number = next(_job_numbers)
+        self.output_path = output_path
+        self.template = template
+        self.output_format = output_format
+        self.app_data = app_data
+        self.segments_data = segments_data
+        self.total_segments = len(segments_data)
+        self.segments_done = 0
+        self.pages_done = 0
+        self.state = PENDING
+        self.error = None
+        self.seconds = 0.0
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"render-{self.number}", daemon=True)
+
+    def start(self):
+        self.state = RUNNING
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def _segments(self):
+        for index, segment in enumerate(self.segments_data):
+            if self._cancel_event.is_set():
+                raise RenderCancelled()
+            self.segments_done = index + 1
+            yield segment
+
+    def _on_page(self, pages, segments, pages_per_second):
+        self.pages_done = pages
+        if self._cancel_event.is_set():
+            raise RenderCancelled()
+
+    def _run(self):
+        logging.info(f"Render job {self.number} started for {self.output_path}.")
+        start = time.perf_counter()
+        directory, file_name = os.path.split(os.path.abspath(self.output_path))
+        temp_path = os.path.join(directory, f".{file_name}.{os.getpid()}-{self.number}.tmp")
+        try:
+            if self.output_format == "pdf":
+                from report import generate_pdf_stream
+                generate_pdf_stream(temp_path, self.app_data, self._segments(), on_progress=self._on_page,
+                                    cache=shared_cache, template=self.template)
+            else:
+                render_report(temp_path, self.output_format, self.app_data, self._segments())
+            self._replace(temp_path)
+            self.state = DONE
+            logging.info(f"Render job {self.number} finished.")
+        except RenderCancelled:
+            self.state = CANCELLED
+            logging.info(f"Render job {self.number} cancelled.")
+        except Exception as e:
+            self.error = e
+            self.state = FAILED
+            logging.error(f"Render job {self.number} failed: {e}")
+        finally:
+            self.seconds = time.perf_counter() - start
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _replace(self, temp_path):
+        key = os.path.abspath(self.output_path)
+        with _replace_lock:
+            if self._cancel_event.is_set() or _last_written.get(key, 0) > self.number:
+                raise RenderCancelled()
+            os.replace(temp_path, self.output_path)
+            _last_written[key] = self.number
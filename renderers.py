@@ -0,0 +1,202 @@
+import sys
+import json
+import html
+import time
+import logging
+import argparse
+import contextlib
+
+import timing
+from source_excerpt import resolve_source, segment_excerpt
+
+# Fence languages of the file types offered in the header
+CODE_LANGUAGES = {"Python": "python", "JavaScript": "javascript", "HTML": "html", "CSS": "css"}
+
+HTML_STYLE = """body { font-family: Helvetica, Arial, sans-serif; max-width: 50em; margin: 2em auto; }
+h1 { color: #4B8BBE; text-align: center; }
+h2 { color: #306998; font-size: 1.2em; }
+pre { background: #F2F2F2; color: #303030; padding: 4px; font-size: 0.8em; }
+hr { border: 0; border-top: 1px solid #000; }"""
+
+
+# A renderer writes one report to a text stream as the segments come in: begin()
+# once, segment() for every segment and end() at the end. Nothing is kept per
+# segment, so memory does not grow with the size of the review.
+class Renderer:
+    name = None
+    extension = None
+
+    def __init__(self, stream, app_data, source_path=None):
+        self.stream = stream
+        self.app_data = app_data
+        self.source_path = source_path
+
+    def excerpt(self, segment):
+        if not self.source_path:
+            return []
+        return segment_excerpt(self.source_path, segment['line_from'], segment['line_to'])
+
+    def begin(self):
+        pass
+
+    def segment(self, index, segment):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+
+# One JSON document: the header data and the list of segments, each with the
+# source lines it refers to when the source file is readable
+class JsonRenderer(Renderer):
+    name = "json"
+    extension = ".json"
+
+    def begin(self):
+        self.stream.write('{"app_data": ')
+        self.stream.write(json.dumps(self.app_data, ensure_ascii=False))
+        self.stream.write(', "segments": [')
+
+    def segment(self, index, segment):
+        excerpt = self.excerpt(segment)
+        if excerpt:
+            segment = dict(segment, excerpt=excerpt)
+        self.stream.write(",\n  " if index else "\n  ")
+        self.stream.write(json.dumps(segment, ensure_ascii=False))
+
+    def end(self):
+        self.stream.write("\n]}\n")
+
+
+class MarkdownRenderer(Renderer):
+    name = "markdown"
+    extension = ".md"
+
+    def begin(self):
+        app_data = self.app_data
+        self.stream.write(f"# {app_data['app_title']}\n\n")
+        for key in ("file_name", "controller_name", "current_date", "file_type"):
+            self.stream.write(f"- **{app_data[key + '_label']}:** {app_data[key]}\n")
+        self.stream.write("\n")
+        self.code_language = CODE_LANGUAGES.get(app_data.get('file_type'), "")
+
+    def segment(self, index, segment):
+        write = self.stream.write
+        write(f"## {segment['segment_title_main']} {index + 1}\n\n")
+        write(f"{segment['line_from_label']} {segment['line_from']} - {segment['line_to_label']} {segment['line_to']}\n\n")
+        excerpt = self.excerpt(segment)
+        if excerpt:
+            code = "\n".join(text for _, text in excerpt)
+            fence = "```"
+            while fence in code:
+                fence += "`"
+            write(f"{fence}{self.code_language}\n{code}\n{fence}\n\n")
+        write(f"**{segment['description_label']}:** {segment['description']}\n\n")
+        write(f"**{segment['menu_label']}:** {segment['menu_option']}\n\n---\n\n")
+
+
+class HtmlRenderer(Renderer):
+    name = "html"
+    extension = ".html"
+
+    def begin(self):
+        app_data = self.app_data
+        title = html.escape(app_data['app_title'])
+        self.stream.write(f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n'
+                          f'<style>\n{HTML_STYLE}\n</style>\n</head>\n<body>\n<h1>{title}</h1>\n<p>\n')
+        for key in ("file_name", "controller_name", "current_date", "file_type"):
+            self.stream.write(f"<strong>{html.escape(app_data[key + '_label'])}:</strong> {html.escape(str(app_data[key]))}<br>\n")
+        self.stream.write("</p>\n")
+
+    def segment(self, index, segment):
+        text = {key: html.escape(str(value)) for key, value in segment.items()}
+        write = self.stream.write
+        write(f"<section>\n<h2>{text['segment_title_main']} {index + 1}</h2>\n")
+        write(f"<p>{text['line_from_label']} {text['line_from']} - {text['line_to_label']} {text['line_to']}</p>\n")
+        excerpt = self.excerpt(segment)
+        if excerpt:
+            width = len(str(excerpt[-1][0]))
+            code = "\n".join(f"{number:>{width}}  {html.escape(line)}" for number, line in excerpt)
+            write(f"<pre>{code}</pre>\n")
+        write(f"<p><strong>{text['description_label']}:</strong> {text['description']}</p>\n")
+        write(f"<p><strong>{text['menu_label']}:</strong> {text['menu_option']}</p>\n<hr>\n</section>\n")
+
+    def end(self):
+        self.stream.write("</body>\n</html>\n")
+
+
+# Text renderers by name. Register another Renderer subclass here to add an
+# output format; "pdf" is handled by report.py and only imported when used.
+RENDERERS = {renderer.name: renderer for renderer in (JsonRenderer, MarkdownRenderer, HtmlRenderer)}
+FORMATS = ["pdf", *RENDERERS]
+EXTENSIONS = {"pdf": ".pdf", **{name: renderer.extension for name, renderer in RENDERERS.items()}}
+
+
+def register_renderer(renderer):
+    RENDERERS[renderer.name] = renderer
+    FORMATS.append(renderer.name)
+    EXTENSIONS[renderer.name] = renderer.extension
+
+
+@contextlib.contextmanager
+def _open_output(output_path):
+    if output_path == "-":
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        with open(output_path, "w", encoding="utf-8", newline="\n") as f:
+            yield f
+
+
+# Render a report in any format from the app_data/segments_data model the app
+# gathers. segments may be any iterable and are consumed one at a time; an
+# output_path of "-" writes to stdout. on_progress(segments) is called after
+# every segment. Returns the number of segments and the time it took.
+def render_report(output_path, output_format, app_data, segments, on_progress=None, template=None):
+    if output_format == "pdf":
+        from report import generate_pdf_stream  # reportlab is only loaded for PDF output
+        progress = (lambda pages, done, pages_per_second: on_progress(done)) if on_progress else None
+        return generate_pdf_stream(output_path, app_data, segments, on_progress=progress, template=template)
+
+    renderer_class = RENDERERS.get(output_format)
+    if renderer_class is None:
+        raise ValueError(f"Unknown report format: {output_format}")
+    logging.info(f"Creating {output_format} report at {output_path}...")
+    start = time.perf_counter()
+    count = 0
+    with _open_output(output_path) as stream:
+        renderer = renderer_class(stream, app_data, resolve_source(app_data))
+        renderer.begin()
+        for index, segment in enumerate(segments):
+            renderer.segment(index, segment)
+            count = index + 1
+            if on_progress:
+                on_progress(count)
+        renderer.end()
+    elapsed = time.perf_counter() - start
+    timing.log_timing(f"{output_format}.render", elapsed, segments=count)
+    logging.info(f"{output_format} report saved to {output_path}: {count} segments in {elapsed:.2f}s.")
+    return {"segments": count, "seconds": elapsed}
+
+
+# Render one review of a batch input file (see batch.load_jobs) to a file or
+# to stdout
+def main(argv=None):
+    from batch import load_jobs
+
+    parser = argparse.ArgumentParser(description="Render a code review report.")
+    parser.add_argument("input", help="JSON or JSONL file with app_data/segments_data reviews")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="markdown", help="output format")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    parser.add_argument("-i", "--index", type=int, default=1, help="number of the review in the file")
+    args = parser.parse_args(argv)
+
+    if args.format == "pdf" and args.output == "-":
+        parser.error("PDF output needs an output file")
+    review = load_jobs(args.input)[args.index - 1]
+    render_report(args.output, args.format, review["app_data"], review.get("segments_data", []))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
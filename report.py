@@ -0,0 +1,280 @@
+import copy
+import time
+import logging
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted, PageBreak, Table, TableStyle
+from reportlab.platypus.tableofcontents import TableOfContents
+
+import timing
+from report_templates import get_template
+from source_excerpt import resolve_source, segment_excerpt
+
+
+# Number of flowables kept queued ahead of the layout engine in streaming mode
+STREAM_LOOKAHEAD = 64
+
+# Log streaming progress every this many pages
+STREAM_LOG_EVERY = 50
+
+
+# Text of the review as paragraph markup. Findings often contain <, > or &
+# (e.g. imported linter messages), which would otherwise be read as markup
+# and fail the whole report.
+def markup(value):
+    return escape(str(value))
+
+
+# Paragraph that remembers how it was broken into lines for an available
+# width. Laying it out again at the same width, in a later frame or as a copy
+# in a later render of a cached segment, skips the line breaking. Copies made
+# with copy.copy share the measurements.
+class MeasuredParagraph(Paragraph):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._measurements = {}
+
+    def wrap(self, availWidth, availHeight):
+        measured = self._measurements.get(availWidth)
+        if measured is not None:
+            self.width, self.height, self.blPara, self._wrapWidths = measured
+            return self.width, self.height
+        result = super().wrap(availWidth, availHeight)
+        self._measurements[availWidth] = (self.width, self.height, self.blPara, self._wrapWidths)
+        return result
+
+    # reportlab's split edits the words of the broken lines in place, and those
+    # lines are shared with the measurements and other copies, so it works on
+    # a private copy. Only paragraphs that cross a page break pay for it.
+    def split(self, availWidth, availHeight):
+        if not hasattr(self, "blPara"):
+            self.wrap(availWidth, availHeight)
+        self.blPara = copy.deepcopy(self.blPara)
+        return super().split(availWidth, availHeight)
+
+
+# Function to create the title and header block of the report
+def header_flowables(app_data, template):
+    styles = template.styles
+    normal_style = styles["normal"]
+    elements = []
+
+    # Add title
+    title = Paragraph(markup(app_data['app_title']), styles["title"])
+    elements.append(title)
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # Add file and controller name info
+    elements.append(Paragraph(f"<strong>{markup(app_data['file_name_label'])}:</strong> {markup(app_data['file_name'])}", normal_style))
+    elements.append(Paragraph(f"<strong>{markup(app_data['controller_name_label'])}:</strong> {markup(app_data['controller_name'])}", normal_style))
+    elements.append(Paragraph(f"<strong>{markup(app_data['current_date_label'])}:</strong> {markup(app_data['current_date'])}", normal_style))
+    elements.append(Paragraph(f"<strong>{markup(app_data['file_type_label'])}:</strong> {markup(app_data['file_type'])}", normal_style))
+    elements.append(Spacer(1, 0.3 * inch))
+    return elements
+
+
+# Function to create the flowables of a single segment. When source_path is
+# given, the referenced lines of the reviewed file are embedded below the line
+# info. With a render cache the part below the title is reused from earlier
+# renders as long as the segment did not change.
+def segment_flowables(index, segment, template, source_path=None, cache=None):
+    elements = []
+
+    # Heading of a group of overlapping segments (see line_index.arrange_segments)
+    if segment.get('overlap_group'):
+        first, last, size = segment['overlap_group']
+        heading = f"{markup(segment['line_from_label'])} {first} - {markup(segment['line_to_label'])} {last} ({size})"
+        elements.append(MeasuredParagraph(heading, template.styles["group"]))
+        elements.append(Spacer(1, 0.1 * inch))
+
+    # Segment Title
+    segment_title = MeasuredParagraph(f"{markup(segment['segment_title_main'])} {index + 1}", template.styles["header"])
+    elements += [segment_title, Spacer(1, 0.1 * inch)]
+
+    if cache is None:
+        elements.extend(segment_body_flowables(segment, template, source_path))
+    else:
+        elements.extend(cache.segment_body(segment, template, source_path, segment_body_flowables))
+    return elements
+
+
+# Function to create everything of a segment below its title
+def segment_body_flowables(segment, template, source_path=None):
+    styles = template.styles
+    normal_style = styles["normal"]
+    elements = []
+
+    # Line Info
+    line_info = MeasuredParagraph(f"{markup(segment['line_from_label'])} {markup(segment['line_from'])} - {markup(segment['line_to_label'])} {markup(segment['line_to'])}", normal_style)
+    elements.append(line_info)
+    elements.append(Spacer(1, 0.05 * inch))
+
+    # Source Excerpt
+    if source_path:
+        excerpt = segment_excerpt(source_path, segment['line_from'], segment['line_to'])
+        if excerpt:
+            width = len(str(excerpt[-1][0]))
+            code = "\n".join(f"{number:>{width}}  {text}" for number, text in excerpt)
+            elements.append(Spacer(1, 0.05 * inch))
+            elements.append(Preformatted(code, styles["code"], maxLineLength=100, newLineChars=""))
+            elements.append(Spacer(1, 0.1 * inch))
+
+    # Description
+    description = MeasuredParagraph(f"<strong>{markup(segment['description_label'])}:</strong> {markup(segment['description'])}", normal_style)
+    elements.append(description)
+    elements.append(Spacer(1, 0.05 * inch))
+
+    # Menu Option
+    menu_option = MeasuredParagraph(f"<strong>{markup(segment['menu_label'])}:</strong> {markup(segment['menu_option'])}", normal_style)
+    elements.append(menu_option)
+
+    # Add a thin line to separate segments
+    elements.append(Spacer(1, 0.2 * inch))
+    elements.append(template.separator())
+    elements.append(Spacer(1, 0.2 * inch))
+    return elements
+
+
+# Function to generate the actual PDF. Pass a render_cache.RenderCache to
+# reuse the flowables of segments that did not change since an earlier render,
+# and the name of a report template (see report_templates) to change the look.
+def generate_pdf(output_path, app_data, segments_data, cache=None, template=None):
+    logging.info(f"Creating PDF document at {output_path}...")
+    # Create a PDF document
+    pdf = SimpleDocTemplate(output_path, pagesize=A4, title=app_data['app_title'], author="Your App")
+    report_template = get_template(template)
+    source_path = resolve_source(app_data)
+
+    with timing.timed("pdf.flowables", segments=len(segments_data)):
+        # Elements to be added to the PDF
+        elements = header_flowables(app_data, report_template)
+
+        # Iterate over each segment and add its data
+        for index, segment in enumerate(segments_data):
+            elements.extend(segment_flowables(index, segment, report_template, source_path, cache))
+
+    # Build the PDF
+    with timing.timed("pdf.build", segments=len(segments_data)) as fields:
+        pdf.build(elements)
+        fields["pages"] = pdf.page
+    if cache is not None:
+        logging.info(f"Render cache: {cache.stats()}")
+    logging.info(f"PDF built successfully and saved to {output_path}.")
+
+
+# List of flowables that is refilled from an iterator whenever the layout
+# engine looks at its length, so only a page or so of flowables is alive at once
+class FlowableStream(list):
+    def __init__(self, iterator, lookahead=STREAM_LOOKAHEAD):
+        super().__init__()
+        self._iterator = iterator
+        self._lookahead = lookahead
+        self._exhausted = False
+
+    def __len__(self):
+        while not self._exhausted and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._iterator))
+            except StopIteration:
+                self._exhausted = True
+        return list.__len__(self)
+
+
+# Function to generate the PDF from an iterator of segments. Segments are
+# turned into flowables lazily and laid out page by page, so only about a page
+# of flowables is alive at once. reportlab still keeps every finished page,
+# compressed, until the document is saved, so memory grows by roughly 2 KB per
+# segment (a quarter to a third of generate_pdf). on_progress(pages, segments,
+# pages_per_second) is called after every finished page.
+def generate_pdf_stream(output_path, app_data, segments, on_progress=None, cache=None, template=None):
+    logging.info(f"Creating streamed PDF document at {output_path}...")
+    pdf = SimpleDocTemplate(output_path, pagesize=A4, title=app_data['app_title'], author="Your App",
+                            pageCompression=1)
+    report_template = get_template(template)
+    source_path = resolve_source(app_data)
+    state = {"segments": 0, "pages": 0, "flowable_seconds": 0.0}
+    start = time.perf_counter()
+
+    def flowables():
+        yield from header_flowables(app_data, report_template)
+        for index, segment in enumerate(segments):
+            state["segments"] = index + 1
+            flowable_start = time.perf_counter()
+            elements = segment_flowables(index, segment, report_template, source_path, cache)
+            state["flowable_seconds"] += time.perf_counter() - flowable_start
+            yield from elements
+
+    def page_done(kind, value):
+        if kind != "PAGE":
+            return
+        state["pages"] = value
+        elapsed = time.perf_counter() - start
+        pages_per_second = value / elapsed if elapsed else 0.0
+        if on_progress:
+            on_progress(value, state["segments"], pages_per_second)
+        if value % STREAM_LOG_EVERY == 0:
+            logging.info(f"Streamed {value} pages ({state['segments']} segments, {pages_per_second:.1f} pages/s).")
+
+    pdf.setProgressCallBack(page_done)
+    pdf.build(FlowableStream(flowables()))
+    elapsed = time.perf_counter() - start
+    timing.log_timing("pdf.flowables", state["flowable_seconds"], segments=state["segments"], streamed=True)
+    timing.log_timing("pdf.build", elapsed, segments=state["segments"], pages=state["pages"], streamed=True)
+    if cache is not None:
+        logging.info(f"Render cache: {cache.stats()}")
+    logging.info(f"Streamed PDF built successfully and saved to {output_path}: "
+                 f"{state['pages']} pages, {state['segments']} segments in {elapsed:.2f}s.")
+    return {"pages": state["pages"], "segments": state["segments"], "seconds": elapsed}
+
+
+# Function to generate the table of contents of a combined report: one row per
+# file with the page its section starts on. Returns the number of pages.
+def generate_toc_pdf(output_path, title, entries, template=None):
+    pdf = SimpleDocTemplate(output_path, pagesize=A4, title=title, author="Your App")
+    report_template = get_template(template)
+    styles = report_template.styles
+    rows = [[Paragraph(markup(name), styles["normal"]), Paragraph(str(page), styles["normal"])] for name, page in entries]
+    table = Table(rows, colWidths=[pdf.width - 0.8 * inch, 0.8 * inch], repeatRows=0)
+    table.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("ALIGN", (1, 0), (1, -1), "RIGHT")]))
+    pdf.build([Paragraph(markup(title), styles["title"]), Spacer(1, 0.3 * inch), table])
+    return pdf.page
+
+
+# Document that reports the section headings of a combined report to its
+# table of contents and bookmarks them
+class CombinedDocTemplate(SimpleDocTemplate):
+    def afterFlowable(self, flowable):
+        toc_entry = getattr(flowable, "toc_entry", None)
+        if toc_entry:
+            key = f"section-{self.page}-{id(flowable)}"
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(toc_entry, key, 0)
+            self.notify("TOCEntry", (0, markup(toc_entry), self.page, key))
+
+
+# Function to generate a combined report of several files in one process: a
+# table of contents and one section per review, each starting on a new page.
+# Used when the sections cannot be rendered separately and merged.
+def generate_combined_pdf(output_path, reviews, toc_title, template=None):
+    logging.info(f"Creating combined PDF document at {output_path}...")
+    pdf = CombinedDocTemplate(output_path, pagesize=A4, title=reviews[0][0]['app_title'] if reviews else toc_title,
+                              author="Your App")
+    report_template = get_template(template)
+    toc = TableOfContents()
+    toc.levelStyles = [report_template.styles["normal"]]
+    elements = [Paragraph(markup(toc_title), report_template.styles["title"]), Spacer(1, 0.3 * inch), toc]
+    for app_data, segments_data in reviews:
+        elements.append(PageBreak())
+        section = header_flowables(app_data, report_template)
+        section[0].toc_entry = app_data['file_name']
+        elements.extend(section)
+        source_path = resolve_source(app_data)
+        for index, segment in enumerate(segments_data):
+            elements.extend(segment_flowables(index, segment, report_template, source_path))
+    with timing.timed("pdf.build", segments=sum(len(segments) for _, segments in reviews), combined=True) as fields:
+        pdf.multiBuild(elements)
+        fields["pages"] = pdf.page
+    logging.info(f"Combined PDF built successfully and saved to {output_path}.")
+    return pdf.page
@@ -0,0 +1,129 @@
+import os
+import copy
+import json
+import hashlib
+import logging
+import threading
+from types import MappingProxyType
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
+from reportlab.platypus.flowables import HRFlowable
+
+THEMES_PATH = os.path.join("dat", "themes.json")
+DEFAULT_TEMPLATE = "default"
+
+ALIGNMENTS = {"left": TA_LEFT, "center": TA_CENTER, "right": TA_RIGHT, "justify": TA_JUSTIFY}
+
+# The look of the built-in report. User themes in dat/themes.json extend it
+# (or another theme) and only list what they change, e.g.
+# {"themes": {"red": {"extends": "default", "title": {"textColor": "#AA0000"}}}}
+DEFAULT_THEME = {
+    "title": {"fontSize": 24, "leading": 28, "alignment": "center", "textColor": "#4B8BBE", "fontName": "Helvetica-Bold"},
+    "header": {"fontSize": 14, "leading": 18, "alignment": "left", "textColor": "#306998", "fontName": "Helvetica-Bold"},
+    "group": {"fontSize": 16, "leading": 20, "alignment": "left", "textColor": "#4B8BBE", "fontName": "Helvetica-Bold"},
+    "normal": {"fontSize": 12, "leading": 15, "alignment": "left", "textColor": "#000000", "fontName": "Helvetica"},
+    "code": {"fontSize": 8, "leading": 10, "alignment": "left", "textColor": "#303030", "backColor": "#F2F2F2",
+             "borderPadding": 4, "fontName": "Courier"},
+    "separator": {"width": 500, "thickness": 1, "color": "#000000"},
+}
+
+_templates = None
+_lock = threading.Lock()
+
+
+# A compiled, read-only report look: paragraph styles plus the prototype of the
+# line drawn between segments
+class ReportTemplate:
+    def __init__(self, name, spec):
+        self.name = name
+        self.fingerprint = hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+        self.styles = MappingProxyType({
+            section: _paragraph_style(f"{name}-{section}", spec[section])
+            for section in ("title", "header", "group", "normal", "code")
+        })
+        separator = spec["separator"]
+        self._separator = HRFlowable(width=separator["width"], thickness=separator["thickness"],
+                                     color=colors.HexColor(separator["color"]), lineCap="butt",
+                                     spaceBefore=0, spaceAfter=0, hAlign="LEFT")
+
+    # A separator line for one segment. Flowables keep layout state, so every
+    # segment gets a shallow copy of the prototype instead of the shared object.
+    def separator(self):
+        return copy.copy(self._separator)
+
+
+def _paragraph_style(name, spec):
+    attributes = dict(spec)
+    attributes["alignment"] = ALIGNMENTS[attributes.get("alignment", "left")]
+    for key in ("textColor", "backColor"):
+        if key in attributes:
+            attributes[key] = colors.HexColor(attributes[key])
+    return ParagraphStyle(name=name, **attributes)
+
+
+# Resolve "extends" chains and merge every section over its parent
+def _resolve_theme(name, themes, seen=()):
+    if name == DEFAULT_TEMPLATE:
+        return copy.deepcopy(DEFAULT_THEME)
+    if name in seen:
+        raise ValueError(f"Theme {name} extends itself")
+    theme = themes[name]
+    spec = _resolve_theme(theme.get("extends", DEFAULT_TEMPLATE), themes, seen + (name,))
+    for section, values in theme.items():
+        if section != "extends":
+            spec.setdefault(section, {}).update(values)
+    return spec
+
+
+def load_user_themes(themes_path=THEMES_PATH):
+    if not os.path.exists(themes_path):
+        return {}
+    with open(themes_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("themes", {})
+
+
+# Compile the built-in template and every user theme. A broken user theme is
+# logged and skipped so it cannot stop reports from being generated.
+def compile_templates(themes_path=THEMES_PATH):
+    templates = {DEFAULT_TEMPLATE: ReportTemplate(DEFAULT_TEMPLATE, DEFAULT_THEME)}
+    try:
+        themes = load_user_themes(themes_path)
+    except Exception as e:
+        logging.error(f"Failed to load report themes: {e}")
+        themes = {}
+    for name in themes:
+        try:
+            templates[name] = ReportTemplate(name, _resolve_theme(name, themes))
+        except Exception as e:
+            logging.error(f"Skipping report theme {name}: {e}")
+    logging.info(f"Report templates loaded: {', '.join(templates)}")
+    return templates
+
+
+# Get a template by name; the registry is compiled once per process. Unknown
+# names fall back to the default template.
+def get_template(name=DEFAULT_TEMPLATE):
+    global _templates
+    if _templates is None:
+        with _lock:
+            if _templates is None:
+                _templates = compile_templates()
+    template = _templates.get(name or DEFAULT_TEMPLATE)
+    if template is None:
+        logging.warning(f"Unknown report theme {name}, using {DEFAULT_TEMPLATE}.")
+        template = _templates[DEFAULT_TEMPLATE]
+    return template
+
+
+def available_templates():
+    get_template()
+    return list(_templates)
+
+
+# Drop the compiled templates so the next get_template() reads the themes again
+def reload_templates():
+    global _templates
+    with _lock:
+        _templates = None
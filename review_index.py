@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import datetime
+
+import lang_catalog
+from segment_store import SEGMENT_TYPES
+
+DB_PATH = os.path.join("dat", "reviews.sqlite3")
+
+# Reports are written in transactions of this many during a back-fill
+BACKFILL_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    file_base TEXT NOT NULL,
+    controller_name TEXT NOT NULL,
+    review_date TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    output_path TEXT,
+    recorded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    review_id INTEGER NOT NULL REFERENCES reviews(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    line_from TEXT NOT NULL,
+    line_to TEXT NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_file ON reviews(file_base, review_date);
+CREATE INDEX IF NOT EXISTS reviews_controller ON reviews(controller_name COLLATE NOCASE, review_date);
+CREATE INDEX IF NOT EXISTS reviews_date ON reviews(review_date);
+CREATE INDEX IF NOT EXISTS reviews_output ON reviews(output_path, file_name);
+CREATE INDEX IF NOT EXISTS segments_review ON segments(review_id, type);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(description, content='segments', content_rowid='id');
+"""
+
+_type_keys = None
+
+
+# Segment types by their label in every language, so reports written in any
+# language are filed under the same type ("note", "possible_problem", "error").
+# Unknown labels are stored in the same shape ("Possible Problem" ->
+# "possible_problem").
+def type_key(label):
+    global _type_keys
+    if _type_keys is None:
+        _type_keys = {}
+        try:
+            for language_code in lang_catalog.available_languages():
+                language = lang_catalog.get_language(language_code)
+                for key in SEGMENT_TYPES:
+                    _type_keys[language[key].casefold()] = key[len("menu_option_"):]
+        except OSError as e:
+            logging.warning(f"Segment type labels are not available: {e}")
+    label = str(label).strip().casefold()
+    return _type_keys.get(label, "_".join(label.split()))
+
+
+def connect(db_path=DB_PATH):
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+# Remove the earlier records of the same report: the rows with the same output
+# file, reviewed file, reviewer and review date. A later review of the file
+# (another date or reviewer) is a new report, even when it is written to the
+# same output file. Returns the smallest removed review ID, so a regenerated
+# report keeps its ID.
+def _remove_report(connection, app_data, output_path):
+    rows = connection.execute(
+        "SELECT id FROM reviews WHERE output_path IS ? AND file_name = ? AND controller_name = ? AND review_date = ?",
+        (output_path, app_data.get('file_name', ''), app_data.get('controller_name', ''),
+         app_data.get('current_date', '')))
+    review_ids = [row[0] for row in rows]
+    for review_id in review_ids:
+        # The FTS table only drops rows it is given with their old content
+        connection.execute("INSERT INTO segments_fts (segments_fts, rowid, description)"
+                           " SELECT 'delete', id, description FROM segments WHERE review_id = ?", (review_id,))
+        connection.execute("DELETE FROM reviews WHERE id = ?", (review_id,))
+    return min(review_ids) if review_ids else None
+
+
+def _insert_report(connection, app_data, segments_data, output_path):
+    file_name = app_data.get('file_name', '')
+    if output_path:
+        output_path = os.path.abspath(output_path)
+    cursor = connection.execute(
+        "INSERT INTO reviews (id, file_name, file_base, controller_name, review_date, file_type, output_path, recorded_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (_remove_report(connection, app_data, output_path), file_name,
+         os.path.basename(file_name.replace("\\", "/")).casefold(), app_data.get('controller_name', ''),
+         app_data.get('current_date', ''), app_data.get('file_type', ''), output_path,
+         datetime.datetime.now().isoformat(timespec="seconds")))
+    review_id = cursor.lastrowid
+    rows = [(review_id, position, str(segment['line_from']), str(segment['line_to']),
+             type_key(segment['menu_option']), segment['description'])
+            for position, segment in enumerate(segments_data)]
+    # Segment IDs are assigned in order after the largest one, so the FTS rows
+    # can be added with a single INSERT ... SELECT
+    first_id = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+    connection.executemany(
+        "INSERT INTO segments (id, review_id, position, line_from, line_to, type, description) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(first_id + offset, *row) for offset, row in enumerate(rows)])
+    connection.execute("INSERT INTO segments_fts (rowid, description) SELECT id, description FROM segments WHERE id >= ?",
+                       (first_id,))
+    return review_id, len(rows)
+
+
+# Record the structured data of a generated report: the header fields and
+# every segment. A report that is generated again replaces its earlier record
+# (see _remove_report), so edits do not multiply the search results. Returns
+# the ID of the review.
+def record_report(app_data, segments_data, output_path=None, db_path=DB_PATH):
+    start = time.perf_counter()
+    connection = connect(db_path)
+    try:
+        with connection:
+            review_id, count = _insert_report(connection, app_data, segments_data, output_path)
+    finally:
+        connection.close()
+    logging.info(f"Review {review_id} indexed: {count} segments in {time.perf_counter() - start:.3f}s.")
+    return review_id
+
+
+# Record many past reports, e.g. the inputs of earlier batch runs. Reviews are
+# (app_data, segments_data, output_path) tuples and are written in
+# transactions of BACKFILL_BATCH. Returns the number of reviews and segments.
+def backfill(reviews, db_path=DB_PATH, batch_size=BACKFILL_BATCH):
+    start = time.perf_counter()
+    connection = connect(db_path)
+    review_count = segment_count = 0
+    try:
+        connection.execute("BEGIN")
+        for app_data, segments_data, output_path in reviews:
+            _, count = _insert_report(connection, app_data, segments_data, output_path)
+            review_count += 1
+            segment_count += count
+            if review_count % batch_size == 0:
+                connection.commit()
+                connection.execute("BEGIN")
+        connection.commit()
+        connection.execute("INSERT INTO segments_fts (segments_fts) VALUES ('optimize')")
+        connection.commit()
+    finally:
+        connection.close()
+    logging.info(f"Back-filled {review_count} reviews with {segment_count} segments in {time.perf_counter() - start:.2f}s.")
+    return review_count, segment_count
+
+
+# Find segments of past reviews. text is an FTS5 query over the descriptions
+# (words, "phrases", prefix*, AND/OR/NOT); file matches the file name or, without
+# a directory, its base name; dates are YYYY-MM-DD and inclusive. The newest
+# reviews come first.
+def search(text=None, file=None, reviewer=None, segment_type=None, date_from=None, date_to=None, limit=100,
+           db_path=DB_PATH):
+    conditions = []
+    parameters = []
+    if text:
+        conditions.append("segments.id IN (SELECT rowid FROM segments_fts WHERE segments_fts MATCH ?)")
+        parameters.append(text)
+    if file:
+        if "/" in file.replace("\\", "/"):
+            conditions.append("reviews.file_name = ?")
+            parameters.append(file)
+        else:
+            conditions.append("reviews.file_base = ?")
+            parameters.append(file.casefold())
+    if reviewer:
+        conditions.append("reviews.controller_name = ? COLLATE NOCASE")
+        parameters.append(reviewer)
+    if segment_type:
+        conditions.append("segments.type = ?")
+        parameters.append(type_key(segment_type))
+    if date_from:
+        conditions.append("reviews.review_date >= ?")
+        parameters.append(date_from)
+    if date_to:
+        conditions.append("reviews.review_date <= ?")
+        parameters.append(date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = (
+        "SELECT reviews.id AS review_id, reviews.file_name, reviews.controller_name, reviews.review_date,"
+        " reviews.output_path, segments.position, segments.line_from, segments.line_to, segments.type,"
+        " segments.description"
+        f" FROM segments JOIN reviews ON reviews.id = segments.review_id {where}"
+        " ORDER BY reviews.review_date DESC, reviews.id DESC, segments.position LIMIT ?"
+    )
+    connection = connect(db_path)
+    try:
+        return [dict(row) for row in connection.execute(query, (*parameters, limit))]
+    finally:
+        connection.close()
+
+
+def _batch_reviews(input_paths):
+    from batch import load_jobs, iter_segments_file
+
+    for input_path in input_paths:
+        for review in load_jobs(input_path):
+            if not isinstance(review.get("app_data"), dict):
+                continue
+            segments_data = review.get("segments_data", [])
+            if review.get("segments_file"):
+                segments_data = list(iter_segments_file(review["segments_file"]))
+            yield review["app_data"], segments_data, review.get("output")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the index of past code review reports.")
+    parser.add_argument("--db", default=DB_PATH, help="index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = commands.add_parser("backfill", help="index the reviews of batch input files")
+    backfill_parser.add_argument("inputs", nargs="+", help="JSON or JSONL files with app_data/segments_data reviews")
+
+    search_parser = commands.add_parser("search", help="search segments of past reviews")
+    search_parser.add_argument("text", nargs="?", help="full-text query over the descriptions")
+    search_parser.add_argument("--file", help="file name, or base name without a directory")
+    search_parser.add_argument("--reviewer", help="controller name")
+    search_parser.add_argument("--type", help="note, possible_problem or error (or a label of any language)")
+    search_parser.add_argument("--since", help="first review date, YYYY-MM-DD")
+    search_parser.add_argument("--until", help="last review date, YYYY-MM-DD")
+    search_parser.add_argument("-n", "--limit", type=int, default=50, help="maximum number of results")
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        reviews, segments = backfill(_batch_reviews(args.inputs), args.db)
+        print(f"Indexed {reviews} reviews with {segments} segments.")
+        return 0
+
+    start = time.perf_counter()
+    results = search(args.text, args.file, args.reviewer, args.type, args.since, args.until, args.limit, args.db)
+    for result in results:
+        print(f"{result['review_date']}  {result['file_name']}:{result['line_from']}-{result['line_to']}  "
+              f"[{result['type']}]  {result['controller_name']}: {result['description']}")
+    print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
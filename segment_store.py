@@ -0,0 +1,97 @@
+import itertools
+
+# Language keys of the segment types, in the order they are offered in the menu
+SEGMENT_TYPES = ["menu_option_note", "menu_option_possible_problem", "menu_option_error"]
+
+
+# Create the plain data of a segment, independent of any widget
+def new_segment(line_from="", line_to="", description="", segment_type=SEGMENT_TYPES[0]):
+    return {"line_from": line_from, "line_to": line_to, "description": description, "type": segment_type}
+
+
+# Ordered collection of segment data keyed by stable IDs, kept apart from the
+# widgets that display it. Deleting a segment only drops it from the ID map;
+# the ordered ID list is compacted lazily, once per batch of changes, the next
+# time the order is needed.
+#
+# on_change, if set, is called with a record of every change (see
+# drafts.apply_record) so the changes can be journaled.
+class SegmentStore:
+    def __init__(self, segments=(), on_change=None):
+        self.on_change = on_change
+        self._segments = {}
+        self._order = []
+        self._stale = False
+        self._next_id = itertools.count(1)
+        self.bulk_add(segments)
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __contains__(self, segment_id):
+        return segment_id in self._segments
+
+    def __iter__(self):
+        for segment_id in self.ids():
+            yield self._segments[segment_id]
+
+    def items(self):
+        for segment_id in self.ids():
+            yield segment_id, self._segments[segment_id]
+
+    def get(self, segment_id):
+        return self._segments[segment_id]
+
+    # Add a segment at the end and return its ID
+    def add(self, segment):
+        segment_id = next(self._next_id)
+        self._segments[segment_id] = segment
+        self._order.append(segment_id)
+        if self.on_change is not None:
+            self.on_change({"op": "add", "id": segment_id, "segment": segment})
+        return segment_id
+
+    # Add many segments in one step and return their IDs
+    def bulk_add(self, segments):
+        return [self.add(segment) for segment in segments]
+
+    # Change some fields of a segment; unknown IDs are ignored
+    def update(self, segment_id, fields):
+        segment = self._segments.get(segment_id)
+        if segment is None:
+            return
+        segment.update(fields)
+        if self.on_change is not None:
+            self.on_change({"op": "edit", "id": segment_id, "fields": fields})
+
+    # Remove a segment in O(1)
+    def delete(self, segment_id):
+        del self._segments[segment_id]
+        self._stale = True
+        if self.on_change is not None:
+            self.on_change({"op": "delete", "ids": [segment_id]})
+
+    def clear(self):
+        self._segments.clear()
+        self._order = []
+        self._stale = False
+        if self.on_change is not None:
+            self.on_change({"op": "clear"})
+
+    # Replace the contents with saved (segment ID, segment) pairs, keeping
+    # their IDs. This is not reported to on_change.
+    def restore(self, items):
+        self._segments = dict(items)
+        self._order = list(self._segments)
+        self._stale = False
+        self._next_id = itertools.count(max(self._segments, default=0) + 1)
+
+    # IDs in display order. The returned list must not be modified.
+    def ids(self):
+        self._compact()
+        return self._order
+
+    def _compact(self):
+        if self._stale:
+            self._order = [segment_id for segment_id in self._order if segment_id in self._segments]
+            self._stale = False
@@ -0,0 +1,303 @@
+import sys
+import math
+import logging
+import tkinter
+
+import customtkinter
+
+import timing
+from line_index import range_is_valid
+from segment_store import SegmentStore, SEGMENT_TYPES, new_segment
+
+# Height of one segment row including its vertical padding
+ROW_HEIGHT = 200
+ROW_WIDTH = 880
+ROW_PADDING = 10
+
+# Pixels scrolled per mouse wheel step
+SCROLL_STEP = ROW_HEIGHT // 4
+
+# Border of line entries that do not hold a valid line range
+INVALID_BORDER_COLOR = "#C0392B"
+
+
+# Work out which segments are visible for a scroll offset: returns the index of
+# the first visible segment and how many pixels of it are scrolled out of view
+def visible_window(offset, count, viewport_height, pool_size):
+    first = offset // ROW_HEIGHT
+    shift = offset % ROW_HEIGHT
+    last = min(count, first + pool_size, math.ceil((offset + viewport_height) / ROW_HEIGHT))
+    return first, shift, range(first, max(first, last))
+
+
+# One recycled row of widgets. It shows whichever segment it is bound to.
+class SegmentRow:
+    def __init__(self, view):
+        self.view = view
+        self.index = None
+        self.segment_id = None
+        self.segment = None
+        language = view.language
+
+        self.frame = customtkinter.CTkFrame(master=view.viewport, width=ROW_WIDTH, height=ROW_HEIGHT - 2 * ROW_PADDING, fg_color="#404040")
+
+        # Number Label
+        self.number_label = customtkinter.CTkLabel(master=self.frame, text="")
+        self.number_label.place(x=10, y=10)
+
+        # "Line From" Entry
+        self.line_from_label = customtkinter.CTkLabel(master=self.frame, text=language["line_from"])
+        self.line_from_label.place(x=10, y=40)
+        self.line_from_entry = customtkinter.CTkEntry(master=self.frame, width=100)
+        self.line_from_entry.place(x=100, y=40)
+
+        # "Line To" Entry
+        self.line_to_label = customtkinter.CTkLabel(master=self.frame, text=language["line_to"])
+        self.line_to_label.place(x=10, y=70)
+        self.line_to_entry = customtkinter.CTkEntry(master=self.frame, width=100)
+        self.line_to_entry.place(x=100, y=70)
+        self.entry_border_color = self.line_from_entry.cget("border_color")
+
+        # "Description" Entry with scrolling and wrapping
+        self.description_label = customtkinter.CTkLabel(master=self.frame, text=language["description"])
+        self.description_label.place(x=220, y=10)
+        self.description_textbox = customtkinter.CTkTextbox(master=self.frame, width=620, height=100, wrap="word")
+        self.description_textbox.place(x=220, y=40)
+
+        # Dropdown Menu for segment type
+        self.menu_label = customtkinter.CTkLabel(master=self.frame, text=language["menu_label"])
+        self.menu_label.place(x=10, y=110)
+        self.menu_var = customtkinter.StringVar()
+        self.menu_dropdown = customtkinter.CTkOptionMenu(master=self.frame, variable=self.menu_var, values=view.type_labels())
+        self.menu_dropdown.place(x=10, y=140)
+
+        # Delete Button to remove the segment this row currently shows
+        self.delete_button = customtkinter.CTkButton(master=self.frame, text=language["delete_button"], command=self.delete)
+        self.delete_button.place(x=720, y=145)
+
+    # Show a segment in this row
+    def bind(self, index, segment_id, segment):
+        language = self.view.language
+        self.number_label.configure(text=f"{language['segment_title_main']} {index + 1}")
+        if segment is not self.segment:
+            self.line_from_entry.delete(0, "end")
+            self.line_from_entry.insert(0, segment["line_from"])
+            self.line_to_entry.delete(0, "end")
+            self.line_to_entry.insert(0, segment["line_to"])
+            self.description_textbox.delete("1.0", "end")
+            self.description_textbox.insert("1.0", segment["description"])
+            self.description_textbox.yview_moveto(0)
+            self.menu_var.set(language[segment["type"]])
+            self.show_range_state(segment["line_from"], segment["line_to"])
+        self.index = index
+        self.segment_id = segment_id
+        self.segment = segment
+
+    # Write what changed in the widgets back into the bound segment
+    def save(self):
+        if self.segment is None:
+            return
+        values = {
+            "line_from": self.line_from_entry.get(),
+            "line_to": self.line_to_entry.get(),
+            "description": self.description_textbox.get("1.0", "end-1c"),
+            "type": self.view.type_key(self.menu_var.get(), self.segment.get("type")),
+        }
+        changed = {key: value for key, value in values.items() if self.segment.get(key) != value}
+        if changed:
+            self.view.store.update(self.segment_id, changed)
+            if "line_from" in changed or "line_to" in changed:
+                self.show_range_state(values["line_from"], values["line_to"])
+
+    # Mark the line entries when they do not hold a valid line range
+    def show_range_state(self, line_from, line_to):
+        color = self.entry_border_color if range_is_valid(line_from, line_to) else INVALID_BORDER_COLOR
+        self.line_from_entry.configure(border_color=color)
+        self.line_to_entry.configure(border_color=color)
+
+    # Re-label the row's static widgets after a language change
+    def relabel(self):
+        language = self.view.language
+        self.line_from_label.configure(text=language["line_from"])
+        self.line_to_label.configure(text=language["line_to"])
+        self.description_label.configure(text=language["description"])
+        self.menu_label.configure(text=language["menu_label"])
+        self.menu_dropdown.configure(values=self.view.type_labels())
+        self.delete_button.configure(text=language["delete_button"])
+        self.segment = None
+
+    def unbind(self):
+        self.index = None
+        self.segment_id = None
+        self.segment = None
+        self.frame.place_forget()
+
+    def delete(self):
+        if self.segment_id is not None:
+            self.view.delete(self.segment_id)
+
+
+# Scrollable list of segments that keeps a fixed pool of row widgets and fills
+# them from the segment data as the user scrolls, so the number of widgets and
+# the cost of scrolling do not depend on the size of the review
+class SegmentListView:
+    def __init__(self, master, language, store=None, width=890, height=600):
+        self.language = language
+        self.height = height
+        self.store = store if store is not None else SegmentStore()
+        self.offset = 0
+        self._refresh_pending = False
+        self._scroll_to_end = False
+
+        self.frame = customtkinter.CTkFrame(master=master, width=width + 20, height=height)
+        self.viewport = customtkinter.CTkFrame(master=self.frame, width=width, height=height, fg_color="transparent")
+        self.viewport.place(x=0, y=0)
+        self.scrollbar = customtkinter.CTkScrollbar(master=self.frame, height=height, command=self.on_scrollbar)
+        self.scrollbar.place(x=width, y=0)
+
+        # Rows are only built once a segment needs them, up to the pool size
+        self.pool_size = math.ceil(height / ROW_HEIGHT) + 1
+        self.rows = []
+
+        # Scroll with the mouse wheel while the pointer is over the list
+        toplevel = self.frame.winfo_toplevel()
+        if sys.platform.startswith("linux"):
+            toplevel.bind_all("<Button-4>", self.on_mouse_wheel, add="+")
+            toplevel.bind_all("<Button-5>", self.on_mouse_wheel, add="+")
+        else:
+            toplevel.bind_all("<MouseWheel>", self.on_mouse_wheel, add="+")
+
+    def place(self, **kwargs):
+        self.frame.place(**kwargs)
+
+    def type_labels(self):
+        return [self.language[key] for key in SEGMENT_TYPES]
+
+    # Key of a segment type label, or default for a label of another language
+    def type_key(self, label, default=SEGMENT_TYPES[0]):
+        for key in SEGMENT_TYPES:
+            if self.language[key] == label:
+                return key
+        return default
+
+    def __len__(self):
+        return len(self.store)
+
+    # Save what the user typed in the visible rows into the segment data
+    def flush(self):
+        for row in self.rows:
+            row.save()
+
+    # Switch to another language in place. Call flush() before the labels of
+    # the language change: the rows still show the old labels, and the segment
+    # types are only saved as their keys while those labels can be looked up.
+    def set_language(self, language):
+        self.language = language
+        for row in self.rows:
+            row.relabel()
+        self.render()
+
+    # Bind the rows of the pool to the segments visible at the current offset
+    def render(self):
+        segment_ids = self.store.ids()
+        first, shift, visible = visible_window(self.offset, len(segment_ids), self.height, self.pool_size)
+        while len(self.rows) < len(visible):
+            self.rows.append(SegmentRow(self))
+        visible_ids = {segment_ids[index] for index in visible}
+        rows_by_id = {row.segment_id: row for row in self.rows if row.segment_id in visible_ids}
+        free_rows = [row for row in self.rows if row.segment_id not in visible_ids]
+        for index in visible:
+            segment_id = segment_ids[index]
+            row = rows_by_id.get(segment_id) or free_rows.pop()
+            row.bind(index, segment_id, self.store.get(segment_id))
+            row.frame.place(x=5, y=(index - first) * ROW_HEIGHT - shift + ROW_PADDING)
+        for row in free_rows:
+            row.unbind()
+
+        total_height = len(segment_ids) * ROW_HEIGHT
+        if total_height <= self.height:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total_height, (self.offset + self.height) / total_height)
+
+    def scroll_to(self, offset):
+        max_offset = max(0, len(self.store) * ROW_HEIGHT - self.height)
+        self.flush()
+        self.offset = int(min(max(0, offset), max_offset))
+        self.render()
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(float(args[0]) * len(self.store) * ROW_HEIGHT)
+        elif action == "scroll":
+            step = self.height if args[1] == "pages" else SCROLL_STEP
+            self.scroll_to(self.offset + int(args[0]) * step)
+
+    def on_mouse_wheel(self, event):
+        # Ignore events outside the list, and let the scrollbar and the
+        # description boxes handle their own wheel events
+        widget_path = str(event.widget)
+        if not widget_path.startswith(str(self.frame)) or widget_path.startswith(str(self.scrollbar)):
+            return
+        if isinstance(event.widget, tkinter.Text):
+            return
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        elif sys.platform == "darwin":
+            steps = -event.delta
+        else:
+            steps = -round(event.delta / 120)
+        self.scroll_to(self.offset + steps * SCROLL_STEP)
+
+    # Renumber and rebind the rows once the current batch of changes is done,
+    # no matter how many segments were added or removed in it
+    def schedule_refresh(self, scroll_to_end=False):
+        self._scroll_to_end = self._scroll_to_end or scroll_to_end
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.frame.after_idle(self.refresh)
+
+    def refresh(self):
+        self._refresh_pending = False
+        offset = len(self.store) * ROW_HEIGHT if self._scroll_to_end else self.offset
+        self._scroll_to_end = False
+        with timing.timed("segment.refresh", segments=len(self.store)):
+            self.scroll_to(offset)
+
+    # Add a segment at the end of the list and scroll to it
+    def add(self, segment=None):
+        with timing.timed("segment.add"):
+            segment_id = self.store.add(segment if segment is not None else new_segment())
+            self.schedule_refresh(scroll_to_end=True)
+        return segment_id
+
+    # Add many segments at once, e.g. when importing a review
+    def add_many(self, segments):
+        logging.info("Adding segments in bulk...")
+        segment_ids = self.store.bulk_add(segments)
+        self.schedule_refresh(scroll_to_end=True)
+        logging.info(f"{len(segment_ids)} segments added.")
+        return segment_ids
+
+    # Remove a segment by its ID
+    def delete(self, segment_id):
+        logging.info(f"Deleting segment #{segment_id}...")
+        with timing.timed("segment.delete"):
+            self.store.delete(segment_id)
+            self.schedule_refresh()
+        logging.info(f"Segment #{segment_id} deleted.")
+
+    # Show saved (segment ID, segment) pairs, e.g. a restored draft
+    def restore(self, items):
+        self.store.restore(items)
+        self.offset = 0
+        self.schedule_refresh()
+
+    def clear(self):
+        logging.info("Clearing all segments...")
+        self.store.clear()
+        self.offset = 0
+        self.schedule_refresh()
+        logging.info("All segments cleared.")
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from renderers import EXTENSIONS, FORMATS, render_report
+from source_excerpt import restrict_sources
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Requests waiting for a worker beyond this are turned away with 503
+DEFAULT_MAX_QUEUE = 32
+
+# Largest accepted request body
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Number of recent render latencies the percentiles are computed from
+LATENCY_WINDOW = 1000
+
+CONTENT_TYPES = {"pdf": "application/pdf", "json": "application/json", "markdown": "text/markdown; charset=utf-8",
+                 "html": "text/html; charset=utf-8"}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+# Load reportlab and compile the report templates once per worker process, so
+# no request pays for it. Clients name the reviewed file themselves, so source
+# excerpts are only read below source_root, and not at all without one.
+def warm_up_worker(source_root=None):
+    restrict_sources(source_root)
+    import report
+    report.get_template()
+
+
+# Render a report in a worker process and return its bytes
+def render_in_worker(output_format, app_data, segments_data, template=None):
+    handle, temp_path = tempfile.mkstemp(suffix=EXTENSIONS[output_format])
+    os.close(handle)
+    try:
+        render_report(temp_path, output_format, app_data, segments_data, template=template)
+        with open(temp_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(temp_path)
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+# Long-running local render service. Requests are rendered on a pool of
+# pre-warmed worker processes; at most `workers` renders run at once, at most
+# max_queue more wait for a worker, and everything beyond that is rejected
+# with 503 and Retry-After instead of piling up.
+class RenderService:
+    def __init__(self, workers=None, max_queue=DEFAULT_MAX_QUEUE, source_root=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.source_root = source_root
+        self.executor = None
+        self.slots = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+
+    async def start(self):
+        self.slots = asyncio.Semaphore(self.workers)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up_worker,
+                                            initargs=(self.source_root,))
+        loop = asyncio.get_running_loop()
+        # Submitting one task per worker starts all processes up front
+        start = time.perf_counter()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, int) for _ in range(self.workers)))
+        logging.info(f"Render service started with {self.workers} workers in {time.perf_counter() - start:.2f}s.")
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def render(self, output_format, app_data, segments_data, template):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HttpError(503, "Render queue is full")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self.executor, render_in_worker, output_format, app_data,
+                                              segments_data, template)
+            self.completed += 1
+            self.latencies.append(time.perf_counter() - start)
+            return data
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        return {
+            "workers": self.workers,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+
+    # Serve one HTTP/1.1 request per connection:
+    #   POST /render?format=pdf&theme=name  body: {"app_data": ..., "segments_data": [...]}
+    #   GET /metrics, GET /health
+    async def handle(self, reader, writer):
+        try:
+            status, content_type, body, headers = await self._respond(reader)
+        except HttpError as e:
+            status, content_type, body = e.status, "application/json", json.dumps({"error": str(e)}).encode("utf-8")
+            headers = {"Retry-After": "1"} if e.status == 503 else {}
+        except Exception as e:
+            logging.error(f"Render request failed: {e}")
+            status, content_type, body, headers = 500, "application/json", json.dumps({"error": str(e)}).encode("utf-8"), {}
+        head = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            raise HttpError(400, "Malformed request")
+        lines = request.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        request_headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                request_headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+
+        if url.path == "/metrics":
+            return 200, "application/json", json.dumps(self.metrics()).encode("utf-8"), {}
+        if url.path == "/health":
+            return 200, "application/json", b'{"status": "ok"}', {}
+        if url.path != "/render":
+            raise HttpError(404, f"Unknown path: {url.path}")
+        if method != "POST":
+            raise HttpError(405, "Use POST to render")
+
+        try:
+            length = int(request_headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+        try:
+            review = json.loads(await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ValueError) as e:
+            raise HttpError(400, f"Invalid review JSON: {e}")
+        if not isinstance(review, dict) or not isinstance(review.get("app_data"), dict):
+            raise HttpError(400, "The review needs app_data")
+
+        query = parse_qs(url.query)
+        output_format = query.get("format", ["pdf"])[0]
+        if output_format not in FORMATS:
+            raise HttpError(400, f"Unknown format: {output_format}")
+        template = query.get("theme", [None])[0]
+        data = await self.render(output_format, review["app_data"], review.get("segments_data", []), template)
+        return 200, CONTENT_TYPES.get(output_format, "application/octet-stream"), data, {}
+
+
+# Start the service and listen on a port (0 picks a free one) or a Unix
+# socket. on_ready(server), if given, is called once requests are accepted.
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, workers=None, max_queue=DEFAULT_MAX_QUEUE,
+                source_root=None, on_ready=None):
+    service = RenderService(workers, max_queue, source_root)
+    await service.start()
+    try:
+        if unix_path:
+            server = await asyncio.start_unix_server(service.handle, path=unix_path)
+            logging.info(f"Listening on {unix_path}")
+        else:
+            server = await asyncio.start_server(service.handle, host, port)
+            logging.info(f"Listening on http://{host}:{server.sockets[0].getsockname()[1]}")
+        async with server:
+            if on_ready:
+                on_ready(server)
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve report rendering on a local port or Unix socket.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of a port")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="requests that may wait for a worker before new ones are rejected")
+    parser.add_argument("--source-root", help="embed source excerpts of files below this directory "
+                                              "(default: no source excerpts)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests and timings to stderr")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.max_queue, args.source_root))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import load_jobs, iter_segments_file
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+DEFAULT_TOC_TITLE = "Contents"
+
+
+# A review session covers several files. It is stored like a batch input: one
+# review (app_data and segments_data, or a segments_file) per file, in the order
+# the files appear in the combined report.
+def load_session(session_path):
+    files = []
+    for review in load_jobs(session_path):
+        if not isinstance(review, dict) or not isinstance(review.get("app_data"), dict):
+            raise ValueError(f"Review {len(files) + 1} of {session_path} has no app_data")
+        segments_data = review.get("segments_data", [])
+        if review.get("segments_file"):
+            segments_data = list(iter_segments_file(review["segments_file"]))
+        files.append((review["app_data"], segments_data))
+    if not files:
+        raise ValueError(f"{session_path} contains no reviews")
+    return files
+
+
+# Render the section of one file in a worker process
+def render_section(output_path, app_data, segments_data, template=None):
+    from report import generate_pdf_stream
+
+    result = generate_pdf_stream(output_path, app_data, segments_data, template=template)
+    return result["pages"]
+
+
+# Render a combined report of all files of a session: a table of contents, then
+# one section per file. The sections are rendered in parallel worker processes
+# and merged in order, so the render time follows the number of cores rather
+# than the number of files. Without pypdf the report is built in one process.
+def render_session(files, output_path, workers=None, template=None):
+    from report import generate_toc_pdf, generate_combined_pdf
+
+    if not files:
+        raise ValueError("A session report needs at least one file")
+    start = time.perf_counter()
+    toc_title = files[0][0].get('toc_title', DEFAULT_TOC_TITLE)
+    directory = os.path.dirname(os.path.abspath(output_path))
+    if pypdf is None:
+        logging.warning("pypdf is not installed, rendering the session in one process.")
+        pages = generate_combined_pdf(output_path, files, toc_title, template)
+        return {"files": len(files), "pages": pages, "seconds": time.perf_counter() - start}
+
+    with tempfile.TemporaryDirectory(dir=directory, prefix=".session-") as temp_dir:
+        section_paths = [os.path.join(temp_dir, f"{index:05d}.pdf") for index in range(len(files))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_section, section_path, app_data, segments_data, template)
+                       for section_path, (app_data, segments_data) in zip(section_paths, files)]
+            section_pages = [future.result() for future in futures]
+        render_seconds = time.perf_counter() - start
+
+        # The page numbers in the contents depend on its own length, which
+        # settles after a second pass at most
+        toc_path = os.path.join(temp_dir, "toc.pdf")
+        toc_pages = 1
+        while True:
+            entries = []
+            page = toc_pages + 1
+            for (app_data, _), pages in zip(files, section_pages):
+                entries.append((app_data['file_name'], page))
+                page += pages
+            rendered_pages = generate_toc_pdf(toc_path, toc_title, entries, template)
+            if rendered_pages == toc_pages:
+                break
+            toc_pages = rendered_pages
+
+        writer = pypdf.PdfWriter()
+        writer.append(toc_path)
+        for section_path, (name, page) in zip(section_paths, entries):
+            writer.append(section_path)
+            writer.add_outline_item(name, page - 1)
+        writer.add_metadata({"/Title": files[0][0]['app_title']})
+        temp_path = os.path.join(temp_dir, "combined.pdf")
+        with open(temp_path, "wb") as f:
+            writer.write(f)
+        os.replace(temp_path, output_path)
+
+    elapsed = time.perf_counter() - start
+    total_pages = toc_pages + sum(section_pages)
+    logging.info(f"Session report saved to {output_path}: {len(files)} files, {total_pages} pages in {elapsed:.2f}s "
+                 f"(sections {render_seconds:.2f}s).")
+    return {"files": len(files), "pages": total_pages, "seconds": elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a multi-file review session into one report.")
+    parser.add_argument("input", help="JSON or JSONL file with one app_data/segments_data review per file")
+    parser.add_argument("-o", "--output", default="session.pdf", help="combined PDF report")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--theme", help="report theme from dat/themes.json (default: the built-in look)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        files = load_session(args.input)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    result = render_session(files, args.output, args.workers, args.theme)
+    print(f"Files: {result['files']}  pages: {result['pages']}  elapsed: {result['seconds']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,10 +5,9 @@ import webbrowser
 import logging
 from tkinter import messagebox
 
-# Set up logging
-log_path = os.path.join("dat", "app.log")
-logging.basicConfig(filename=log_path, level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+import applog
+import log_excerpt
+import lang_catalog
 
 # Load settings
 def load_settings():
@@ -21,108 +20,146 @@ def load_settings():
 
 # Load language file for settings
 def load_settings_language(language_code):
-    logging.info(f"Loading language file for: {language_code}")
-    lang_path = os.path.join("lang", f"{language_code}_settings.json")
-    with open(lang_path, "r") as f:
-        language = json.load(f)
-    logging.info("Language file loaded successfully.")
+    logging.info(f"Loading settings language for: {language_code}")
+    language = lang_catalog.get_settings_language(language_code)
+    logging.info("Settings language loaded successfully.")
     return language
 
-# Load settings and language
-settings = load_settings()
-settings_language = load_settings_language(settings["language"])
-
 # Get list of available languages
 def get_available_languages():
     logging.info("Getting available languages...")
-    lang_dir = "lang"
-    languages = [f.split("_")[0] for f in os.listdir(lang_dir) if f.endswith("_settings.json")]
+    languages = lang_catalog.available_languages()
     logging.info(f"Available languages: {languages}")
     return languages
 
 # Save settings back to settings.json
-def save_settings():
+def save_settings(settings, settings_language, parent=None):
     try:
         logging.info("Saving settings...")
         settings_path = os.path.join("dat", "settings.json")
         with open(settings_path, "w") as f:
             json.dump(settings, f, indent=4)
-        messagebox.showinfo(settings_language["settings_save_title"], settings_language["settings_save_message"])
+        messagebox.showinfo(settings_language["settings_save_title"], settings_language["settings_save_message"], parent=parent)
         logging.info("Settings saved successfully.")
     except Exception as e:
         logging.error(f"Failed to save settings: {e}")
-        messagebox.showerror(settings_language["settings_error_title"], f"{settings_language['settings_save_error']}: {e}")
-
-# Function to change the language
-def change_language(new_language):
-    logging.info(f"Changing language to: {new_language}")
-    settings["language"] = new_language
-    save_settings()
+        messagebox.showerror(settings_language["settings_error_title"], f"{settings_language['settings_save_error']}: {e}", parent=parent)
 
-# Function to send an email with log content as the body
-def send_report_issue():
+# Function to send an email with the end of the log as the body. With
+# write_attachment the last session is also saved to dat/issue_report.txt.gz.
+def send_report_issue(settings_language, parent=None, write_attachment=True):
     try:
         logging.info("Preparing to report issue via email...")
         email = "samuellabant@gmail.com"  # Your email address
         subject = settings_language["settings_email_subject"]
 
-        # Read the content of the log file
+        intro = settings_language["settings_email_body"]
+
+        # Read only the end of the log file: the last session, within a fixed size
         log_path = os.path.join("dat", "app.log")
         if os.path.exists(log_path):
-            with open(log_path, 'r') as log_file:
-                log_content = log_file.read()
+            records = log_excerpt.last_session(log_excerpt.tail_records(log_path, log_excerpt.BUNDLE_MAX_RECORDS, log_excerpt.BUNDLE_MAX_BYTES))
+            facts = log_excerpt.environment_facts(log_path, records)
+            if write_attachment:
+                bundle_path = log_excerpt.write_bundle(os.path.join("dat", "issue_report.txt.gz"), intro, facts, records)
+                intro = f"{intro}\n\n{settings_language['settings_email_attachment'].format(path=os.path.abspath(bundle_path))}"
+            records = records[-log_excerpt.EMAIL_MAX_RECORDS:]
         else:
-            log_content = settings_language["settings_log_file_not_found"]
+            records = [settings_language["settings_log_file_not_found"]]
+            facts = []
 
-        # Prepare the mailto link with the log content as the email body
-        body = f"{settings_language['settings_email_body']}\n\n{log_content}"
-        mailto_link = f"mailto:{email}?subject={subject}&body={body}"
+        # Prepare the mailto link with the newest records that fit into the URL
+        mailto_link, record_count = log_excerpt.build_mailto(email, subject, intro, facts, records)
+        logging.info(f"Issue report contains {record_count} log records.")
 
         # Open the default email client with the mailto link
         webbrowser.open(mailto_link)
-        messagebox.showinfo(settings_language["report_issue_title"], settings_language["report_issue_message"])
+        messagebox.showinfo(settings_language["report_issue_title"], settings_language["report_issue_message"], parent=parent)
         logging.info("Issue report email prepared with log content.")
     except Exception as e:
         logging.error(f"Failed to prepare the email: {e}")
-        messagebox.showerror(settings_language["settings_error_title"], f"{settings_language['settings_email_send_error']}: {e}")
-
-# Initialize the UI
-logging.info("Initializing UI...")
-app = customtkinter.CTk()
-app.geometry("400x300")
-app.title(settings_language["settings_title"])
-
-# Label for language selection
-language_label = customtkinter.CTkLabel(master=app, text=settings_language["settings_select_language"])
-language_label.pack(pady=10)
-
-# Dropdown for selecting language
-available_languages = get_available_languages()
-language_var = customtkinter.StringVar(value=settings["language"])
-language_dropdown = customtkinter.CTkOptionMenu(master=app, variable=language_var, values=available_languages, command=change_language)
-language_dropdown.pack(pady=10)
-
-# Button to save settings
-save_button = customtkinter.CTkButton(master=app, text=settings_language["settings_save_button"], command=lambda: save_settings())
-save_button.pack(pady=10)
-
-# Button to report an issue (send email with log content)
-report_issue_button = customtkinter.CTkButton(master=app, text=settings_language["settings_report_issue_button"], command=send_report_issue)
-report_issue_button.pack(pady=10)
-
-# Button to view the app.log file
-def view_log_file():
+        messagebox.showerror(settings_language["settings_error_title"], f"{settings_language['settings_email_send_error']}: {e}", parent=parent)
+
+# Function to open the app.log file
+def view_log_file(settings_language, parent=None):
     log_path = os.path.join("dat", "app.log")
     if os.path.exists(log_path):
         os.system(f'open "{log_path}"')  # Use 'start' on Windows, 'open' on macOS, and 'xdg-open' on Linux
         logging.info("Log file opened successfully.")
     else:
         logging.error("Log file not found.")
-        messagebox.showerror(settings_language["settings_error_title"], settings_language["settings_log_file_not_found"])
-
-view_log_button = customtkinter.CTkButton(master=app, text=settings_language["settings_view_log_button"], command=view_log_file)
-view_log_button.pack(pady=10)
-
-logging.info("Starting the settings application...")
-app.mainloop()
-logging.info("Settings application closed.")
+        messagebox.showerror(settings_language["settings_error_title"], settings_language["settings_log_file_not_found"], parent=parent)
+
+# Build the settings widgets inside window. settings is the dict shared with the
+# caller; on_language_change(language_code) is called after the language was
+# changed and saved, so the caller can re-label its own widgets.
+def build_settings_ui(window, settings, on_language_change=None):
+    settings_language = load_settings_language(settings["language"])
+    window.geometry("400x300")
+    window.title(settings_language["settings_title"])
+
+    # Label for language selection
+    language_label = customtkinter.CTkLabel(master=window, text=settings_language["settings_select_language"])
+    language_label.pack(pady=10)
+
+    # Function to change the language and re-label this window in place
+    def change_language(new_language):
+        logging.info(f"Changing language to: {new_language}")
+        settings["language"] = new_language
+        settings_language.clear()
+        settings_language.update(load_settings_language(new_language))
+        window.title(settings_language["settings_title"])
+        for widget, key in localized_widgets:
+            widget.configure(text=settings_language[key])
+        save_settings(settings, settings_language, parent=window)
+        if on_language_change:
+            on_language_change(new_language)
+
+    # Dropdown for selecting language
+    available_languages = get_available_languages()
+    language_var = customtkinter.StringVar(value=settings["language"])
+    language_dropdown = customtkinter.CTkOptionMenu(master=window, variable=language_var, values=available_languages, command=change_language)
+    language_dropdown.pack(pady=10)
+
+    # Button to save settings
+    save_button = customtkinter.CTkButton(master=window, text=settings_language["settings_save_button"], command=lambda: save_settings(settings, settings_language, parent=window))
+    save_button.pack(pady=10)
+
+    # Button to report an issue (send email with log content)
+    report_issue_button = customtkinter.CTkButton(master=window, text=settings_language["settings_report_issue_button"], command=lambda: send_report_issue(settings_language, parent=window))
+    report_issue_button.pack(pady=10)
+
+    # Button to view the app.log file
+    view_log_button = customtkinter.CTkButton(master=window, text=settings_language["settings_view_log_button"], command=lambda: view_log_file(settings_language, parent=window))
+    view_log_button.pack(pady=10)
+
+    localized_widgets = [
+        (language_label, "settings_select_language"),
+        (save_button, "settings_save_button"),
+        (report_issue_button, "settings_report_issue_button"),
+        (view_log_button, "settings_view_log_button"),
+    ]
+    return window
+
+# Open the settings as a window of the running application
+def open_settings_window(master, settings, on_language_change=None):
+    logging.info("Opening settings window...")
+    window = customtkinter.CTkToplevel(master)
+    build_settings_ui(window, settings, on_language_change)
+    window.after(10, window.focus)
+    logging.info("Settings window opened.")
+    return window
+
+
+if __name__ == "__main__":
+    # Set up logging
+    applog.setup_logging()
+
+    # Initialize the UI
+    logging.info("Initializing UI...")
+    app = customtkinter.CTk()
+    build_settings_ui(app, load_settings())
+
+    logging.info("Starting the settings application...")
+    app.mainloop()
+    logging.info("Settings application closed.")
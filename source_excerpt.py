@@ -0,0 +1,116 @@
+import os
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+
+# Number of indexed files kept open, least recently used first out
+MAX_CACHED_FILES = 16
+
+# Longest excerpt embedded for one segment
+MAX_EXCERPT_LINES = 40
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Set by restrict_sources: whether source files are limited, and the directory
+# they must lie in (None reads no source files at all)
+_restricted = False
+_source_root = None
+
+
+# A source file mapped into memory together with the byte offset of every line
+# start. The index is built once; every excerpt after that is a single slice.
+class SourceFile:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.offsets = self._index_lines(size)
+
+    def _index_lines(self, size):
+        offsets = array("Q", [0])
+        find = self._map.find
+        position = find(b"\n")
+        while position != -1:
+            offsets.append(position + 1)
+            position = find(b"\n", position + 1)
+        if offsets[-1] != size:
+            offsets.append(size)
+        return offsets
+
+    @property
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    # Lines first..last (1-based, inclusive), clipped to the file
+    def lines(self, first, last):
+        first = max(1, first)
+        last = min(self.line_count, last)
+        if first > last:
+            return []
+        text = self._map[self.offsets[first - 1]:self.offsets[last]].decode("utf-8", errors="replace")
+        if text.endswith("\n"):
+            text = text[:-1]
+        return [line.rstrip("\r") for line in text.split("\n")]
+
+
+# Get the indexed file for a path. Entries are keyed by path, modification time
+# and size, so an edited file is indexed again.
+def get_source_file(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        source = _cache.get(key)
+        if source is not None:
+            _cache.move_to_end(key)
+            return source
+        source = SourceFile(path)
+        _cache[key] = source
+        # Evicted maps are closed once no render uses them any more
+        while len(_cache) > MAX_CACHED_FILES:
+            _cache.popitem(last=False)
+        return source
+
+
+# Limit the source files of this process to the files below root, or read no
+# source files at all without a root. Used where the header data comes from
+# other users, e.g. the render service, so a report cannot embed any file the
+# process can read. Relative paths are then taken relative to root.
+def restrict_sources(root=None):
+    global _restricted, _source_root
+    _restricted = True
+    _source_root = os.path.realpath(root) if root else None
+
+
+# Path of the reviewed file if it can be read: an explicit "source_path" in the
+# header data, otherwise the file name itself
+def resolve_source(app_data):
+    if _restricted and _source_root is None:
+        return None
+    for path in (app_data.get("source_path"), app_data.get("file_name")):
+        if not path:
+            continue
+        if _restricted:
+            path = os.path.realpath(os.path.join(_source_root, path))
+            if os.path.commonpath([_source_root, path]) != _source_root:
+                continue
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+# Source lines referenced by a segment as (line number, text) pairs. Returns an
+# empty list when the range is not a valid pair of line numbers.
+def segment_excerpt(source_path, line_from, line_to, max_lines=MAX_EXCERPT_LINES):
+    try:
+        first = int(str(line_from).strip())
+        last = int(str(line_to or line_from).strip())
+    except ValueError:
+        return []
+    if last < first:
+        first, last = last, first
+    last = min(last, first + max_lines - 1)
+    lines = get_source_file(source_path).lines(first, last)
+    return list(zip(range(max(1, first), max(1, first) + len(lines)), lines))
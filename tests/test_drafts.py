@@ -0,0 +1,139 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drafts import DraftJournal
+from segment_store import SegmentStore, new_segment
+
+
+class DraftJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.directory, "draft_snapshot.json")
+        self.journal_path = os.path.join(self.directory, "draft_journal.jsonl")
+        self.drafts = []
+
+    def tearDown(self):
+        for draft in self.drafts:
+            draft.close()
+        shutil.rmtree(self.directory)
+
+    # Open the draft like the app does: restore the saved segments into a store
+    # and journal every change from then on
+    def open_draft(self, compact_min_bytes=0):
+        draft = DraftJournal(self.snapshot_path, self.journal_path, compact_min_bytes)
+        self.drafts.append(draft)
+        saved = draft.open()
+        store = SegmentStore()
+        if saved is not None:
+            store.restore(saved[1])
+        store.on_change = draft.record
+        return draft, store, saved
+
+    def close(self, draft):
+        draft.close()
+        self.drafts.remove(draft)
+
+    def test_no_draft(self):
+        _, store, saved = self.open_draft()
+        self.assertIsNone(saved)
+        self.assertEqual(len(store), 0)
+
+    def test_restore_keeps_ids(self):
+        draft, store, _ = self.open_draft()
+        first, second, third = store.bulk_add([new_segment("1", "2", "a"), new_segment("5"), new_segment("9", "9", "c")])
+        store.delete(second)
+        store.update(third, {"description": "changed", "type": "menu_option_error"})
+        draft.record_header({"file_name": "app.py", "controller_name": "Ann"})
+        draft.flush()
+        self.close(draft)
+
+        draft, restored, saved = self.open_draft()
+        self.assertEqual(saved[0], {"file_name": "app.py", "controller_name": "Ann"})
+        self.assertEqual(list(restored.items()), list(store.items()))
+        self.assertEqual(restored.ids(), [first, third])
+        self.assertEqual(restored.get(third)["description"], "changed")
+        # New segments continue after the restored IDs
+        self.assertGreater(restored.add(new_segment()), third)
+
+    def test_cut_off_record(self):
+        draft, store, _ = self.open_draft()
+        store.bulk_add([new_segment("1"), new_segment("2")])
+        draft.flush()
+        self.close(draft)
+        valid_size = os.path.getsize(self.journal_path)
+        # A crash in the middle of writing the next record
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"op":"add","id":3,"segment":{"line_fr')
+
+        draft, store, saved = self.open_draft()
+        self.assertEqual([segment["line_from"] for _, segment in saved[1]], ["1", "2"])
+        self.assertEqual(os.path.getsize(self.journal_path), valid_size)
+
+        # Records appended after the truncation replay cleanly
+        segment_id = store.add(new_segment("3"))
+        draft.flush()
+        self.close(draft)
+        _, _, saved = self.open_draft()
+        self.assertEqual([segment_id for segment_id, _ in saved[1]], [1, 2, segment_id])
+
+    def test_compaction(self):
+        draft, store, _ = self.open_draft(compact_min_bytes=64)
+        for line in range(1, 21):
+            store.add(new_segment(str(line), str(line), "x" * 20))
+        store.delete(1)
+        draft.record_header({"file_name": "app.py"})
+        draft.flush()
+        self.assertTrue(draft.needs_compaction())
+        draft.compact(store.items())
+        self.assertFalse(draft.needs_compaction())
+
+        store.update(2, {"description": "after compaction"})
+        draft.flush()
+        self.close(draft)
+
+        draft, restored, saved = self.open_draft()
+        self.assertEqual(draft.generation, 1)
+        self.assertEqual(saved[0], {"file_name": "app.py"})
+        self.assertEqual(list(restored.items()), list(store.items()))
+        self.assertEqual(restored.get(2)["description"], "after compaction")
+
+    def test_journal_of_interrupted_compaction_is_ignored(self):
+        draft, store, _ = self.open_draft()
+        store.bulk_add([new_segment("1"), new_segment("2")])
+        draft.flush()
+        with open(self.journal_path, "rb") as f:
+            old_journal = f.read()
+        draft.compact(store.items())
+        self.close(draft)
+        # The new snapshot was written, but the crash came before the journal
+        # of the new generation was started
+        with open(self.journal_path, "wb") as f:
+            f.write(old_journal)
+
+        draft, restored, saved = self.open_draft()
+        # Replaying the old journal over the new snapshot would add its
+        # segments a second time
+        self.assertEqual(list(restored.items()), list(store.items()))
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), '{"generation":1}\n')
+
+    def test_snapshot_of_interrupted_compaction_is_ignored(self):
+        draft, store, _ = self.open_draft()
+        store.bulk_add([new_segment("1"), new_segment("2")])
+        draft.flush()
+        self.close(draft)
+        # The crash came while the new snapshot was written
+        with open(self.snapshot_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write('{"generation":1,"header":{},"segm')
+
+        _, restored, _ = self.open_draft()
+        self.assertEqual(list(restored.items()), list(store.items()))
+
+
+if __name__ == "__main__":
+    unittest.main()
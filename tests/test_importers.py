@@ -0,0 +1,72 @@
+import io
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importers import iter_sarif_results, parse_sarif
+
+
+def sarif_result(rule_id, path, line, message="", level="warning"):
+    return {"ruleId": rule_id, "level": level, "message": {"text": message},
+            "locations": [{"physicalLocation": {"artifactLocation": {"uri": path}, "region": {"startLine": line}}}]}
+
+
+# A SARIF log with "results" keys in property bags, strings that look like
+# JSON structure, results that are not objects, and several runs
+SARIF_LOG = {
+    "version": "2.1.0",
+    "runs": [
+        {
+            "tool": {"driver": {"name": "lint", "rules": [
+                {"id": "E1", "properties": {"results": [sarif_result("FAKE", "rules.py", 1)]}},
+            ]}},
+            "invocations": [{"properties": {"results": ["x", sarif_result("FAKE", "bag.py", 2)]}}],
+            "results": [
+                sarif_result("E1", "app.py", 3, 'quoted "results": [ and } ] { and a backslash \\', "error"),
+                "not a result",
+                7,
+                sarif_result("W2", "app.py", 1234567, "ünïcödé"),
+            ],
+            "properties": {"results": [sarif_result("FAKE", "run.py", 4)]},
+        },
+        {"results": []},
+        {"tool": {"driver": {"name": "other"}}},
+        {"results": [sarif_result("E3", "lib/util.py", 10)]},
+    ],
+}
+
+EXPECTED = [result for run in SARIF_LOG["runs"] for result in run.get("results", []) if isinstance(result, dict)]
+
+
+class SarifImportTest(unittest.TestCase):
+    def test_only_run_results_are_read(self):
+        results = list(iter_sarif_results(io.StringIO(json.dumps(SARIF_LOG))))
+        self.assertEqual(results, EXPECTED)
+
+    def test_block_boundaries(self):
+        # Every key, string, number and bracket ends up split across blocks
+        for indent in (None, 2):
+            text = json.dumps(SARIF_LOG, indent=indent, ensure_ascii=False)
+            for read_size in range(1, 33):
+                with self.subTest(indent=indent, read_size=read_size):
+                    results = list(iter_sarif_results(io.StringIO(text), read_size=read_size))
+                    self.assertEqual(results, EXPECTED)
+
+    def test_segments(self):
+        entries = list(parse_sarif(io.StringIO(json.dumps(SARIF_LOG))))
+        self.assertEqual([(path, segment['line_from'], segment['type']) for path, segment in entries],
+                         [("app.py", "3", "menu_option_error"), ("app.py", "1234567", "menu_option_possible_problem"),
+                          ("lib/util.py", "10", "menu_option_possible_problem")])
+
+    def test_invalid_documents(self):
+        for text in ('[{"ruleId": "E1"}]', '{"runs": [{"results": [{"ruleId": "E1"}'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(iter_sarif_results(io.StringIO(text), read_size=4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import synthetic_review
+from service import serve
+
+
+async def request(port, method, path, body=b"", headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    response_headers = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split(" ")[1]), response_headers, body
+
+
+def review_body(segment_count, **app_data):
+    review_app_data, segments_data = synthetic_review(segment_count)
+    review_app_data.update(app_data)
+    return json.dumps({"app_data": review_app_data, "segments_data": segments_data}).encode("utf-8")
+
+
+# Starts the render service on a free localhost port with one worker, so that
+# a single slow render fills the pool and the queue behind it
+class RenderServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.source_dir = tempfile.TemporaryDirectory()
+        ready = asyncio.get_running_loop().create_future()
+        self.task = asyncio.create_task(serve(port=0, workers=1, max_queue=1, source_root=self.source_dir.name,
+                                              on_ready=ready.set_result))
+        server = await asyncio.wait_for(ready, 60)
+        self.port = server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.task
+        self.source_dir.cleanup()
+
+    async def test_render(self):
+        status, headers, body = await request(self.port, "POST", "/render?format=pdf", review_body(5))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "application/pdf")
+        self.assertTrue(body.startswith(b"%PDF"))
+
+        status, _, body = await request(self.port, "POST", "/render?format=json", review_body(5))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(json.loads(body)["segments"]), 5)
+
+    async def test_source_excerpts_stay_below_root(self):
+        with open(os.path.join(self.source_dir.name, "example.py"), "w") as f:
+            f.write("".join(f"inside_{line}\n" for line in range(1, 6000)))
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+            f.write("".join(f"outside_{line}\n" for line in range(1, 6000)))
+        try:
+            for file_name, expected in (("example.py", b"inside_"), (f.name, None), ("../" + os.path.basename(f.name), None)):
+                status, _, body = await request(self.port, "POST", "/render?format=markdown",
+                                                review_body(3, file_name=file_name))
+                self.assertEqual(status, 200)
+                self.assertNotIn(b"outside_", body)
+                if expected:
+                    self.assertIn(expected, body)
+        finally:
+            os.remove(f.name)
+
+    async def test_bad_requests(self):
+        status, _, _ = await request(self.port, "POST", "/render", b"{}", {"Content-Length": "x"})
+        self.assertEqual(status, 400)
+        status, _, _ = await request(self.port, "POST", "/render?format=doc", review_body(1))
+        self.assertEqual(status, 400)
+        status, _, _ = await request(self.port, "POST", "/render", b'{"segments_data": []}')
+        self.assertEqual(status, 400)
+        status, _, _ = await request(self.port, "GET", "/render")
+        self.assertEqual(status, 405)
+        status, _, _ = await request(self.port, "GET", "/missing")
+        self.assertEqual(status, 404)
+
+    async def test_backpressure_and_metrics(self):
+        # The first render takes the only worker, the second waits in the
+        # queue and the rest are turned away
+        body = review_body(300)
+        responses = await asyncio.gather(*(request(self.port, "POST", "/render", body) for _ in range(5)))
+        statuses = sorted(status for status, _, _ in responses)
+        self.assertEqual(statuses, [200, 200, 503, 503, 503])
+        for status, headers, _ in responses:
+            if status == 503:
+                self.assertEqual(headers["Retry-After"], "1")
+
+        status, _, body = await request(self.port, "GET", "/metrics")
+        self.assertEqual(status, 200)
+        metrics = json.loads(body)
+        self.assertEqual(metrics["completed"], 2)
+        self.assertEqual(metrics["rejected"], 3)
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["in_flight"], 0)
+        self.assertGreater(metrics["p50_ms"], 0)
+
+        status, _, body = await request(self.port, "GET", "/health")
+        self.assertEqual((status, json.loads(body)), (200, {"status": "ok"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
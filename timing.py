@@ -0,0 +1,61 @@
+import time
+import logging
+from contextlib import contextmanager
+
+# Moment this module was first imported. main.py imports it before anything
+# else, so marks are measured from the start of the application.
+START = time.perf_counter()
+
+_marks = []
+_durations = []
+
+
+# Record that a startup phase has finished
+def mark(name):
+    _marks.append((name, time.perf_counter()))
+
+
+# Record a duration measured elsewhere, e.g. on a background thread
+def record(name, seconds):
+    _durations.append((name, seconds))
+
+
+# Startup phases between consecutive marks, in milliseconds
+def startup_phases():
+    phases = []
+    previous = START
+    for name, moment in _marks:
+        phases.append({"phase": name, "ms": (moment - previous) * 1000, "total_ms": (moment - START) * 1000})
+        previous = moment
+    return phases
+
+
+def startup_report():
+    lines = ["Startup timing:"]
+    for phase in startup_phases():
+        lines.append(f"  {phase['phase']:<16}{phase['ms']:9.1f} ms  (at {phase['total_ms']:.1f} ms)")
+    for name, seconds in _durations:
+        lines.append(f"  {name:<16}{seconds * 1000:9.1f} ms  (background)")
+    return "\n".join(lines)
+
+
+def log_startup_report():
+    for line in startup_report().splitlines():
+        logging.info(line)
+
+
+# Log how long a piece of work took as a structured record, e.g.
+# {"timing": "pdf.build", "ms": 812.4, "segments": 300}
+def log_timing(name, seconds, **fields):
+    logging.info(f"timing {name}", extra={"fields": dict(timing=name, ms=round(seconds * 1000, 3), **fields)})
+
+
+# Time the body of a with block and log it with log_timing(). The yielded dict
+# can be used to add fields that are only known at the end.
+@contextmanager
+def timed(name, **fields):
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        log_timing(name, time.perf_counter() - start, **fields)